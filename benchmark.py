@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# Copyright 2009 Jeremy Worboys <jemthealmighty@gmail.com>
+# Licensed for distribution under the GPL version 3
+#
+# Headless benchmarks for forms.py
+#
+# Usage:
+#	python benchmark.py [-o bench_output.txt] [--quick]
+#
+# Results are written as JSON: one record per measurement with its name,
+# parameters, value and unit. Every timing is the best of several repeats
+# so numbers are comparable between runs on the same machine.
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sys, time, json, platform
+from functools import partial
+from optparse import OptionParser
+import pygame
+import pygame.locals as PL
+
+SCREEN_SIZE				= (800,600)	# Pixels
+REPEATS					= 5			# Timings taken of each benchmark, the best is kept
+
+def best(function, number, repeats=REPEATS):
+	''' Return the best time in seconds of one call, of `repeats` runs of `number` calls to `function` '''
+	times = []
+	for _ in xrange(repeats):
+		start = time.time()
+		for _ in xrange(number):
+			function()
+		times.append((time.time()-start)/number)
+	return min(times)
+
+def key(k, u=''):
+	return pygame.event.Event(PL.KEYDOWN, key=k, unicode=u, mod=0)
+
+def make_select(options=20, **kwargs):
+	sel = forms.Select(**kwargs)
+	sel.add_options([('option %d' % i, i) for i in xrange(options)])
+	sel._value = 0
+	return sel
+
+def make_frame(children=10):
+	frame = forms.Frame((300,400), (10,10), border_width=1)
+	frame.add_objects([('ft%d' % i, forms.Text('label %d' % i, label_size=14)) for i in xrange(children)])
+	return frame
+
+def make_image():
+	images = []
+	for i in xrange(4):
+		img = pygame.Surface((64,64)).convert()
+		img.fill((60*i, 100, 200))
+		images.append(img)
+	return forms.Image(images, auto_scroll=False)
+
+def make_form(n, **kwargs):
+	# A column of mixed objects
+	f = forms.Form(False, **kwargs)
+	objects = []
+	for i in xrange(n):
+		kind = i%3
+		if kind == 0:
+			objects.append(('text%d' % i, forms.Text('Some text %d' % i, label_size=16)))
+		elif kind == 1:
+			objects.append(('input%d' % i, forms.Input('Input %d' % i, 'value %d' % i, label_size=16, input_size=16)))
+		else:
+			objects.append(('button%d' % i, forms.Button('Button %d' % i, f.submit, (), size=16)))
+	f.add_objects(objects)
+	return f
+
+class Results(list):
+	def add(self, name, value, unit, **params):
+		self.append({'name': name, 'params': params, 'value': value, 'unit': unit})
+		print >> sys.stderr, '%-28s %-32s %12.3f %s' % (name, ' '.join('%s=%s' % kv for kv in sorted(params.iteritems())), value, unit)
+
+def bench_draw(results, screen, quick):
+	''' Frames per second of Form._draw '''
+	for n in (10, 100, 1000):
+		number = (20, 5)[quick]
+		# Everything repainted every frame
+		f = make_form(n)
+		f._flip = False
+		f._draw(screen)
+		def full():
+			f.refresh()
+			f._draw(screen)
+		results.add('draw_fps', 1/best(full, number), 'fps', objects=n, mode='full')
+		# One input's cursor flashing each frame, only it repainted
+		f = make_form(n, dirty_rects=True)
+		f._flip = False
+		f._draw(screen)
+		inp = f._objects['input1']._input
+		def dirty():
+			inp._cursor_on = not inp._cursor_on
+			f._draw(screen)
+		results.add('draw_fps', 1/best(dirty, number*10), 'fps', objects=n, mode='dirty')
+
+def bench_surfaces(results, screen, quick):
+	''' Per widget get_surface cost, re-rendering and cached '''
+	widgets = [
+		('Text', forms.Text('Some text to render', label_size=22)),
+		('TextInput', forms.TextInput('Some input value')),
+		('Button', forms.Button('Submit', None, ())),
+		('Select', make_select()),
+		('Select(open)', make_select()),
+		('Frame', make_frame()),
+		('Image', make_image()),
+	]
+	widgets[4][1]._is_active = True
+	number = (200, 20)[quick]
+	for name, obj in widgets:
+		obj.get_surface()
+		def render():
+			obj._restyled()
+			obj.get_surface()
+		results.add('get_surface', best(render, number)*1e6, 'us', widget=name, cached=False)
+		results.add('get_surface', best(obj.get_surface, number*10)*1e6, 'us', widget=name, cached=True)
+
+def bench_update(results, screen, quick):
+	''' Event processing throughput of Form.update and Form.update_events '''
+	f = make_form(10)
+	f._flip = False
+	f._draw(screen)
+	f._handle(key(PL.K_TAB))
+	events = [key(PL.K_a, u'a'), key(PL.K_BACKSPACE), key(PL.K_LEFT), key(PL.K_RIGHT)]
+	number = (200, 20)[quick]
+	def update():
+		for e in events:
+			f.update(screen, e)
+	results.add('update', len(events)/best(update, number), 'events/s', method='update')
+	def update_events():
+		f.update_events(screen, events)
+	results.add('update', len(events)/best(update_events, number), 'events/s', method='update_events')
+
+def bench_scaling(results, screen, quick):
+	''' Cost of adding and removing objects and options as collections grow.
+	Objects are removed from the front, the worst case for the index's list moves. '''
+	sizes = ((100, 1000, 10000, 100000), (100, 1000))[quick]
+	for n in sizes:
+		texts = [('t%d' % i, forms.Text('t%d' % i)) for i in xrange(n)]
+		f = forms.Form(False)
+		start = time.time()
+		for name, obj in texts:
+			f.add_object(name, obj)
+		results.add('add_object', (time.time()-start)/n*1e6, 'us/op', objects=n)
+		start = time.time()
+		for name, _ in texts:
+			f.rem_object(name)
+		results.add('rem_object', (time.time()-start)/n*1e6, 'us/op', objects=n)
+		sel = forms.Select()
+		start = time.time()
+		for i in xrange(n):
+			sel.add_option('option %d' % i, i)
+		results.add('add_option', (time.time()-start)/n*1e6, 'us/op', options=n)
+
+def bench_hooks(results, screen, quick):
+	''' Cost of running a hook with no, one and several listeners '''
+	number = (100000, 10000)[quick]
+	for n in (0, 1, 4):
+		hooks = forms.HookController(None)
+		for i in xrange(n):
+			hooks.add('__draw__', lambda parent: None, priority=i)
+		run = partial(hooks.run, '__draw__', '__focus_switch__')
+		results.add('hook_run', best(run, number)*1e6, 'us', listeners=n)
+
+def bench_startup(results, screen, quick):
+	''' Time to build a form from a spec and draw its first frame, objects built eagerly and lazily '''
+	spec = {'objects': [{'name': 'field%d' % i, 'type': 'Input', 'label': 'Field %d' % i, 'value': 'value %d' % i, 'label_size': 16, 'input_size': 16} for i in xrange(300)]}
+	spec = forms.FormSpec(spec)
+	number = (5, 2)[quick]
+	for lazy in (False, True):
+		def start():
+			f = spec.build(lazy=lazy)
+			f._flip = False
+			f._draw(screen)
+		results.add('startup', best(start, number)*1e3, 'ms', objects=len(spec), lazy=lazy)
+
+def bench_sync(results, screen, quick):
+	''' Cost of mirroring a form's values each frame, read in full and as the changes since the last frame '''
+	number = (20, 5)[quick]
+	for n in (100, 1000):
+		f = make_form(n)
+		f._flip = False
+		f._draw(screen)
+		inputs = [f._objects['input%d' % i]._input for i in xrange(1, n, 3)][:3]
+		def edit():
+			for inp in inputs:
+				inp._type_char('ab')
+				inp._backspace()
+		def full():
+			edit()
+			dict(forms.FormResult(f._objects, f._journal))
+		seen = [f.last_change()]
+		def changes():
+			edit()
+			f.changes(seen[0])
+			seen[0] = f.last_change()
+		results.add('sync', best(full, number)*1e3, 'ms', objects=n, method='result')
+		results.add('sync', best(changes, number)*1e3, 'ms', objects=n, method='changes')
+
+BENCHMARKS = [bench_draw, bench_surfaces, bench_update, bench_scaling, bench_hooks, bench_startup, bench_sync]
+
+if __name__ == '__main__':
+	parser = OptionParser(usage='%prog [options]')
+	parser.add_option('-o', '--output', help='write the JSON results to FILE instead of stdout', metavar='FILE')
+	parser.add_option('-q', '--quick', action='store_true', default=False, help='fewer iterations and smaller sizes')
+	options, args = parser.parse_args()
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+	pygame.init()
+	screen = pygame.display.set_mode(SCREEN_SIZE, 0, 32)
+	import forms
+	# Keep the cursor from flashing part way through a timing
+	forms.CURSOR_FLASH_SPEED = 1e9
+	results = Results()
+	for bench in BENCHMARKS:
+		bench(results, screen, options.quick)
+	out = json.dumps({
+		'python'		: platform.python_version(),
+		'pygame'		: pygame.version.ver,
+		'platform'		: platform.platform(),
+		'video_driver'	: os.environ['SDL_VIDEODRIVER'],
+		'quick'			: options.quick,
+		'results'		: results
+	}, indent=1, sort_keys=True)
+	if options.output:
+		f = open(options.output, 'w')
+		f.write(out+'\n')
+		f.close()
+	else:
+		print out
+	pygame.quit()
@@ -45,8 +45,25 @@
 #				function for the action.
 # 		[ ] Major error checking.
 
-import pygame, time
+import pygame, time, os, weakref, json
 import pygame.locals as PL
+from collections import OrderedDict, deque, Mapping
+from itertools import izip
+from bisect import bisect_left, bisect_right
+from functools import partial
+from types import GeneratorType
+from timeit import default_timer
+# concurrent.futures is only needed to offload actions, on Python 2 install
+# the "futures" backport (pip install futures)
+try:
+	from concurrent import futures
+except ImportError:
+	futures = None
+# PyYAML is only needed to load form specs from YAML files
+try:
+	import yaml
+except ImportError:
+	yaml = None
 
 FPS						= 25		# Frames per second
 CURSOR_FLASH_SPEED		= .7		# Seconds
@@ -54,38 +71,913 @@ KEY_REPEAT_DELAY		= 500		# Milliseconds
 KEY_REPEAT_INTERVAL		= 150		# Milliseconds
 SCROLL_BAR_WIDTH		= 10		# Pixels
 STANDARD_MARGIN 		= (20,20)	# (H,V) Pixels
+HOTSPOT_CELL_SIZE		= 64		# Pixels
+SELECT_ROWS				= 5			# Options shown by an open Select
+SELECT_ROW_CACHE		= 64		# Rendered rows kept by a VirtualSelect
+FADE_FRAMES				= 12		# Most precomposed frames for a fading background
+MODAL_DIM				= (0,0,0,128)	# Colour laid over a form behind a modal form
+TEXT_CACHE_SIZE			= 4194304	# Bytes of rendered text to keep
+SURFACE_POOL_SIZE		= 8388608	# Bytes of spare surfaces to keep
+PROFILE_FRAMES			= 300		# Frames kept by a form's profiler
+IMAGE_CACHE_SIZE		= 16777216	# Bytes of decoded frames kept by each Image
+IMAGE_EXTENSIONS		= ('.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tga')
+LAZY_HEIGHT				= 30		# Pixels assumed for an object from a FormSpec before it is built
+JOURNAL_SIZE			= 4096		# Value changes kept by each form's change journal
 
-_IMAGES_				= [] 		# A container for all updating Image objects
 _CLOCK_					= pygame.time.Clock()
+_MISSING_				= object()	# Marker for attributes that are not yet set
+_TASKS_					= []		# Actions still running after the call which started them
+_POOL_					= None		# Executor running offloaded actions, see get_pool
+_OFFLOADED_				= set()		# Offloaded actions which have not finished
+_SPECS_					= {}		# Compiled FormSpecs of spec files, by path
+
+WORKERS					= 4			# Threads in the default pool for offloaded actions
+OFFLOAD_POLL			= .25		# Seconds between checks of offloaded actions whose DONE_EVENT was lost
+
+# Event types of the form's own events. Without pygame.event.custom_type the
+# last two ids below NUMEVENTS are reserved, apps should not post them
+if hasattr(pygame.event, 'custom_type'):
+	WAKE_EVENT			= pygame.event.custom_type()
+	DONE_EVENT			= pygame.event.custom_type()
+else:
+	WAKE_EVENT			= PL.NUMEVENTS-1	# Posted to wake a waiting form
+	DONE_EVENT			= PL.NUMEVENTS-2	# Posted when an offloaded action finishes
+
+# Event types a running form never uses, so they are kept off the queue
+_IGNORED_EVENTS_		= [PL.ACTIVEEVENT, PL.KEYUP, PL.MOUSEBUTTONDOWN,
+						   PL.JOYAXISMOTION, PL.JOYBALLMOTION, PL.JOYHATMOTION,
+						   PL.JOYBUTTONDOWN, PL.JOYBUTTONUP]
+
+class Style(dict):
+	''' A style dict which flags its owner as changed when it is edited '''
+	def __init__(self, owner, *args, **kwargs):
+		dict.__init__(self, *args, **kwargs)
+		self._owner = owner
+
+	def __setitem__(self, key, value):
+		if self.get(key, _MISSING_) != value:
+			dict.__setitem__(self, key, value)
+			self._owner._restyled()
+
+	def __delitem__(self, key):
+		dict.__delitem__(self, key)
+		self._owner._restyled()
+
+	def update(self, *args, **kwargs):
+		for k, v in dict(*args, **kwargs).iteritems():
+			self[k] = v
+
+class TextCache(object):
+	''' A size bounded LRU cache of rendered text surfaces.
+	Entries are keyed by (font, text, color, antialias) and the least
+	recently used are evicted once `max_bytes` is exceeded. '''
+	def __init__(self, max_bytes=TEXT_CACHE_SIZE):
+		self.max_bytes = max_bytes
+		self._entries = OrderedDict()
+		self._bytes = 0
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+
+	def render(self, font, text, antialias, color):
+		''' Return `font.render(text, antialias, color)`, reusing earlier renders '''
+		key = (font, text, tuple(color), bool(antialias))
+		surf = self._entries.pop(key, None)
+		if surf is None:
+			self._misses += 1
+			surf = font.render(text, antialias, color)
+			self._bytes += surf.get_width()*surf.get_height()*surf.get_bytesize()
+		else:
+			self._hits += 1
+		# Most recently used entries are kept at the end
+		self._entries[key] = surf
+		self._trim()
+		return surf
+
+	def _trim(self):
+		# Evict the least recently used entries
+		while self._bytes > self.max_bytes and len(self._entries) > 1:
+			_, surf = self._entries.popitem(False)
+			self._bytes -= surf.get_width()*surf.get_height()*surf.get_bytesize()
+			self._evictions += 1
+
+	def set_limit(self, max_bytes):
+		''' Change the memory limit, evicting entries if needed '''
+		self.max_bytes = max_bytes
+		self._trim()
+
+	def clear(self, font=None):
+		''' Remove all entries or only those rendered with `font` '''
+		for key in [k for k in self._entries if font is None or k[0] is font]:
+			surf = self._entries.pop(key)
+			self._bytes -= surf.get_width()*surf.get_height()*surf.get_bytesize()
+
+	def stats(self):
+		''' Return usage and eviction statistics '''
+		return {
+			'entries'	: len(self._entries),
+			'bytes'		: self._bytes,
+			'max_bytes'	: self.max_bytes,
+			'hits'		: self._hits,
+			'misses'	: self._misses,
+			'evictions'	: self._evictions
+		}
+
+_TEXT_CACHE_			= TextCache()	# Shared by all objects rendering text
+
+def render_text(font, text, color, antialias=True):
+	''' Render text through the shared text cache '''
+	return _TEXT_CACHE_.render(font, text, antialias, color)
+
+class SurfacePool(object):
+	''' Spare surfaces kept for reuse instead of allocating new ones.
+	Surfaces are keyed by size and format and the least recently returned
+	are dropped once `max_bytes` is exceeded. Only surfaces lent by the
+	pool are taken back. '''
+	def __init__(self, max_bytes=SURFACE_POOL_SIZE):
+		self.max_bytes = max_bytes
+		self._free = OrderedDict()
+		self._keys = {}
+		self._lent = weakref.WeakValueDictionary()
+		self._bytes = 0
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+
+	def _key(self, surf):
+		return (surf.get_size(), bool(surf.get_flags() & PL.SRCALPHA), surf.get_bitsize())
+
+	def get(self, size, alpha=True):
+		''' Borrow a surface of `size` in the display format, with per pixel alpha if `alpha`.
+		Its contents are undefined. '''
+		key = (tuple(size), alpha, (pygame.display.get_surface().get_bitsize(), 32)[alpha])
+		ids = self._keys.get(key)
+		if ids:
+			self._hits += 1
+			surf = self._free.pop(ids.pop())
+			if not ids:
+				del self._keys[key]
+			self._bytes -= surf.get_width()*surf.get_height()*surf.get_bytesize()
+		else:
+			self._misses += 1
+			surf = pygame.Surface(size)
+			surf = (surf.convert(), surf.convert_alpha())[alpha]
+		self._lent[id(surf)] = surf
+		return surf
+
+	def put(self, surf):
+		''' Give back a borrowed surface '''
+		if self._lent.get(id(surf)) is not surf:
+			return
+		del self._lent[id(surf)]
+		surf.set_clip(None)
+		# Most recently returned surfaces are kept at the end
+		self._free[id(surf)] = surf
+		self._keys.setdefault(self._key(surf), []).append(id(surf))
+		self._bytes += surf.get_width()*surf.get_height()*surf.get_bytesize()
+		self._trim()
+
+	def _trim(self):
+		# Drop the least recently returned surfaces
+		while self._bytes > self.max_bytes:
+			i, surf = self._free.popitem(False)
+			key = self._key(surf)
+			self._keys[key].remove(i)
+			if not self._keys[key]:
+				del self._keys[key]
+			self._bytes -= surf.get_width()*surf.get_height()*surf.get_bytesize()
+			self._evictions += 1
+
+	def set_limit(self, max_bytes):
+		''' Change the memory limit, dropping spare surfaces if needed '''
+		self.max_bytes = max_bytes
+		self._trim()
+
+	def clear(self):
+		''' Drop all spare surfaces, e.g. after the display format changes '''
+		self._free.clear()
+		self._keys.clear()
+		self._bytes = 0
+
+	def stats(self):
+		''' Return usage and eviction statistics '''
+		return {
+			'surfaces'	: len(self._free),
+			'lent'		: len(self._lent),
+			'bytes'		: self._bytes,
+			'max_bytes'	: self.max_bytes,
+			'hits'		: self._hits,
+			'misses'	: self._misses,
+			'evictions'	: self._evictions
+		}
+
+_SURFACES_				= SurfacePool()	# Scratch and rendered surfaces of all objects
+
+class SharedFont(pygame.font.Font):
+	''' A font handed out by the font registry and shared between objects.
+	It can not be restyled, ask `get_font` for a styled variant instead. '''
+	def _restyle(self, value):
+		raise TypeError('Shared fonts can not be restyled, use get_font()')
+
+	set_bold = set_italic = set_underline = _restyle
+
+class FontRegistry(object):
+	''' Hands out one shared font per (file, size, bold, italic, underline) '''
+	def __init__(self):
+		self._fonts = {}
+
+	def get(self, font=None, size=22, style=()):
+		''' Return the shared font for `font` at `size` with `style` applied '''
+		if isinstance(font, SharedFont):
+			# Derive a variant of another shared font
+			font, size, bold, italic, underline = font._key
+		elif isinstance(font, pygame.font.Font):
+			# Fonts created elsewhere are styled in place
+			for s in style:
+				if s == 'bold' : font.set_bold(True)
+				elif s == 'italic' : font.set_italic(True)
+				elif s == 'underline' : font.set_underline(True)
+			return font
+		else:
+			size, bold, italic, underline = int(size), False, False, False
+		key = (font, size, bold or 'bold' in style, italic or 'italic' in style, underline or 'underline' in style)
+		if key not in self._fonts:
+			f = SharedFont(font, size)
+			pygame.font.Font.set_bold(f, key[2])
+			pygame.font.Font.set_italic(f, key[3])
+			pygame.font.Font.set_underline(f, key[4])
+			f._key = key
+			self._fonts[key] = f
+		return self._fonts[key]
+
+	def _file_size(self, font):
+		# Size of the font file each loaded font keeps a face of
+		if font is None:
+			font = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+		try:
+			return os.path.getsize(font)
+		except (TypeError, OSError):
+			return 0
+
+	def clear(self):
+		''' Forget all shared fonts and any text rendered with them '''
+		for f in self._fonts.itervalues():
+			_TEXT_CACHE_.clear(f)
+		self._fonts.clear()
+
+	def stats(self):
+		''' Return the number of loaded fonts and their approximate memory use '''
+		return {
+			'fonts'	: len(self._fonts),
+			'bytes'	: sum([self._file_size(k[0]) for k in self._fonts])
+		}
 
-class HookController(dict):
+_FONTS_					= FontRegistry()	# Shared by all objects using fonts
+
+def get_font(font=None, size=22, style=()):
+	''' Get a shared font from the font registry '''
+	return _FONTS_.get(font, size, style)
+
+class Task(object):
+	''' An action still running after the function which started it returned.
+	A generator is stepped once a frame, a future (anything with `done()`)
+	is checked once a frame. Offloaded actions are stepped when their
+	DONE_EVENT is handled instead. '''
+	def __init__(self, work, on_done=None, owner=None):
+		self._work = work
+		self._on_done = on_done
+		self._future = (None, work)[hasattr(work, 'done')]
+		self._cancelled = False
+		self.owner = owner
+
+	def cancel(self):
+		''' Stop the task. An offloaded action which has already started runs to the end but its result is dropped. '''
+		self._cancelled = True
+		if self._future is not None:
+			self._future.cancel()
+
+	def step(self):
+		''' Advance the task, returning True once it has finished.\nErrors raised by the action are passed on. '''
+		done = False
+		try:
+			if self._cancelled:
+				done = True
+			elif self._future is None:
+				try:
+					next(self._work)
+				except StopIteration:
+					done = True
+			else:
+				done = self._future.done()
+				if done and not self._future.cancelled():
+					self._future.result()
+		except:
+			done = True
+			raise
+		finally:
+			if done and self._on_done:
+				self._on_done()
+		return done
+
+def start_task(result, on_done=None):
+	''' Keep "result" running alongside the form if it is a generator or future.\nReturns the Task, or None if "result" has already finished. '''
+	if not isinstance(result, GeneratorType) and not hasattr(result, 'done'):
+		return None
+	task = Task(result, on_done)
+	_TASKS_.append(task)
+	return task
+
+def set_pool(executor):
+	''' Run offloaded actions on "executor", eg. a concurrent.futures.ProcessPoolExecutor.\nReturns the previous executor, which is not shut down. '''
+	global _POOL_
+	pool, _POOL_ = _POOL_, executor
+	return pool
+
+def get_pool():
+	''' Return the executor for offloaded actions, starting a pool of WORKERS threads the first time '''
+	global _POOL_
+	if _POOL_ is None:
+		if futures is None:
+			raise ImportError('Offloading actions needs concurrent.futures (the "futures" package on Python 2)')
+		_POOL_ = futures.ThreadPoolExecutor(WORKERS)
+	return _POOL_
+
+def offload(function, args=(), kwargs={}, on_done=None, owner=None):
+	''' Call function(*args, **kwargs) on the offload pool, keeping the form running meanwhile.\nReturns a Task which is finished, calling "on_done" and passing on any error, when the form handles its DONE_EVENT. '''
+	future = get_pool().submit(function, *args, **kwargs)
+	task = Task(future, on_done, owner)
+	_OFFLOADED_.add(task)
+	future.add_done_callback(partial(_post_done, task))
+	return task
+
+def _post_done(task, future):
+	# Called on a worker thread, hand the task back to the main thread. When
+	# the event can't be posted (full queue, pygame quit) poll_tasks finds
+	# the finished future instead
+	try:
+		pygame.event.post(pygame.event.Event(DONE_EVENT, task=task))
+	except pygame.error:
+		pass
+
+def _finish_offloaded(task):
+	# Step an offloaded task once, by its DONE_EVENT or by poll_tasks
+	if task in _OFFLOADED_:
+		_OFFLOADED_.discard(task)
+		task.step()
+
+def poll_tasks():
+	''' Advance all running tasks once, dropping those which have finished.
+Offloaded actions whose DONE_EVENT never arrived are finished here. '''
+	for task in [t for t in _OFFLOADED_ if t._future.done()]:
+		_finish_offloaded(task)
+	tasks = list(_TASKS_)
+	del _TASKS_[:]
+	for i, task in enumerate(tasks):
+		try:
+			if not task.step():
+				_TASKS_.append(task)
+		except:
+			# Keep the other tasks before passing the error on
+			_TASKS_.extend(tasks[i+1:])
+			raise
+
+def wait_event(deadline=None):
+	''' Block until an event arrives or `time.time()` reaches `deadline` '''
+	if deadline is None:
+		return pygame.event.wait()
+	ms = max(1, int((deadline-time.time())*1000)+1)
+	try:
+		return pygame.event.wait(ms)
+	except TypeError:
+		# Older pygame can not time out, so wake with a timer event
+		pygame.time.set_timer(WAKE_EVENT, ms)
+		e = pygame.event.wait()
+		pygame.time.set_timer(WAKE_EVENT, 0)
+		return e
+
+def _is_char(e):
+	# Whether the event types a single printable character
+	return (e.type == PL.KEYDOWN and e.key not in (PL.K_TAB, PL.K_RETURN, PL.K_BACKSPACE)
+		and len(e.unicode) == 1 and u' ' <= e.unicode != u'\x7f')
+
+def coalesce_events(events):
+	''' Merge runs of redundant events into single events:
+		MOUSEMOTION		-> one motion with the summed `rel`
+		Up/down keys	-> one key with a `count` of presses
+		Typed chars		-> one K_UNKNOWN key with all the chars as `unicode` '''
+	out = []
+	for e in events:
+		if out and out[-1].type == e.type:
+			last = out[-1]
+			d = dict(last.dict)
+			if e.type == PL.MOUSEMOTION:
+				d.update(e.dict)
+				d['rel'] = (last.rel[0]+e.rel[0], last.rel[1]+e.rel[1])
+			elif e.type == PL.KEYDOWN and e.key in (PL.K_UP, PL.K_DOWN) and last.key == e.key:
+				d['count'] = getattr(last, 'count', 1)+1
+			elif _is_char(e) and (_is_char(last) or last.key == PL.K_UNKNOWN and last.unicode):
+				d['key'] = PL.K_UNKNOWN
+				d['unicode'] = last.unicode+e.unicode
+			else:
+				out.append(e)
+				continue
+			out[-1] = pygame.event.Event(e.type, d)
+		else:
+			out.append(e)
+	return out
+
+class ObjectIndex(object):
+	''' An ordered sequence of unique names.
+	Edits are done with list slicing (a C level move rather than shifting
+	entries one by one). Positions are kept in a dict, which is only correct
+	before the first changed position, later ones being found by a scan. '''
+	def __init__(self, names=()):
+		self._names = list(names)
+		self._pos = {}
+		self._valid = 0		# Positions below this are correct in self._pos
+
+	def __len__(self):
+		return len(self._names)
+
+	def __iter__(self):
+		return iter(self._names)
+
+	def __getitem__(self, i):
+		return self._names[i]
+
+	def __contains__(self, name):
+		return name in self._pos
+
+	def insert(self, i, names):
+		''' Insert a list of names before position `i` '''
+		self._names[i:i] = names
+		self._pos.update(izip(names, xrange(i, i+len(names))))
+		self._valid = min(self._valid, i)
+
+	def remove(self, name):
+		''' Remove `name`, returning the position it had '''
+		i = self._pos.pop(name)
+		if i >= self._valid:
+			# A scan is cheaper than updating every later position
+			i = self._names.index(name, self._valid)
+		del self._names[i]
+		self._valid = min(self._valid, i)
+		return i
+
+class GapBuffer(object):
+	''' A text buffer with a movable gap at the last edit, so that inserts
+	and deletes near the cursor are O(1) amortised '''
+	def __init__(self, text='', gap=64):
+		self._buf = list(text)+[None]*gap
+		self._start = len(text)		# Gap start
+		self._end = len(self._buf)	# Gap end
+
+	def __len__(self):
+		return len(self._buf)-(self._end-self._start)
+
+	def _move(self, pos):
+		# Move the gap to pos
+		buf = self._buf
+		if pos < self._start:
+			n = self._start-pos
+			buf[self._end-n:self._end] = buf[pos:self._start]
+			self._start, self._end = pos, self._end-n
+		elif pos > self._start:
+			n = pos-self._start
+			buf[self._start:pos] = buf[self._end:self._end+n]
+			self._start, self._end = pos, self._end+n
+
+	def insert(self, pos, text):
+		''' Insert `text` before position `pos` '''
+		self._move(pos)
+		if len(text) > self._end-self._start:
+			# Grow the gap
+			grow = max(len(text), len(self._buf))
+			self._buf[self._end:self._end] = [None]*grow
+			self._end += grow
+		self._buf[self._start:self._start+len(text)] = list(text)
+		self._start += len(text)
+
+	def delete(self, pos, n):
+		''' Remove `n` characters from position `pos` '''
+		self._move(pos)
+		self._end = min(self._end+n, len(self._buf))
+
+	def slice(self, a, b):
+		''' Return the text between positions a and b '''
+		gap = self._end-self._start
+		if b <= self._start:
+			return ''.join(self._buf[a:b])
+		elif a >= self._start:
+			return ''.join(self._buf[a+gap:b+gap])
+		return ''.join(self._buf[a:self._start]+self._buf[self._end:b+gap])
+
+	def text(self):
+		''' Return all the text '''
+		return self.slice(0, len(self))
+
+	def find(self, char, start=0):
+		''' Return the position of the first `char` at or after `start`, or -1 '''
+		n = len(self)
+		while start < n:
+			end = min(start+256, n)
+			i = self.slice(start, end).find(char)
+			if i >= 0:
+				return start+i
+			start = end
+		return -1
+
+	def rfind(self, char, end):
+		''' Return the position of the last `char` before `end`, or -1 '''
+		while end > 0:
+			start = max(end-256, 0)
+			i = self.slice(start, end).rfind(char)
+			if i >= 0:
+				return start+i
+			end = start
+		return -1
+
+class HotspotGrid(object):
+	''' A uniform grid over hotspot rects for constant time hit testing '''
+	def __init__(self, hotspots, cell=HOTSPOT_CELL_SIZE):
+		self._hotspots = hotspots
+		self._cell = cell
+		self._cells = {}
+		for i, (rect, _) in enumerate(hotspots):
+			for cx in xrange(rect.left//cell, (rect.right-1)//cell+1):
+				for cy in xrange(rect.top//cell, (rect.bottom-1)//cell+1):
+					self._cells.setdefault((cx, cy), []).append(i)
+
+	def __len__(self):
+		return len(self._hotspots)
+
+	def at(self, pos):
+		''' Return the hotspots containing `pos`, in the order they were drawn '''
+		hs = self._hotspots
+		return [hs[i] for i in self._cells.get((pos[0]//self._cell, pos[1]//self._cell), ()) if hs[i][0].collidepoint(pos)]
+
+class Layout(object):
+	''' The positions of the objects directly inside a Form or Frame, kept until something moves them '''
+	def __init__(self, objects, index, frame=None):
+		self._objects = objects
+		self._index = index
+		self._frame = frame
+		self._members = None
+		self._placed = None
+		self._key = None
+
+	def reset(self):
+		''' Forget the objects and their positions after an add or remove '''
+		self._members = None
+		self._placed = None
+
+	def invalidate(self):
+		''' Forget the positions after an object has moved or resized '''
+		self._placed = None
+
+	def members(self):
+		''' Return the directly contained objects in index order '''
+		if self._members is None:
+			objects, frame = self._objects, self._frame
+			self._members = [objects[n] for n in self._index if objects[n]._in_frame is frame]
+		return self._members
+
+	def render(self):
+		''' Render the objects which have changed, forgetting the positions if one has resized '''
+		for o in self.members():
+			if o._surface is None:
+				size = o.get_surface().get_size()
+				if o._rect is None or o._rect.size != size:
+					self._placed = None
+
+	def place(self, width, c_y):
+		''' Return a list of (object, rect) in drawing order, for a container `width` wide with the flow starting at `c_y` '''
+		if self._placed is None or self._key != (width, c_y):
+			self._key = (width, c_y)
+			placed, top = [], None
+			for o in self.members():
+				size = o.get_surface().get_size()
+				left = (o.style['left'],(width-size[0])//2)[o.style['left']=='center']
+				if isinstance(o, Select) and o._is_active:
+					if o.style['position'] == 'absolute':
+						top = (o, pygame.Rect((left, o.style['top']-(size[1]-o.style['height'])//2), size))
+					else:
+						top = (o, pygame.Rect((left, o.style['top']+c_y-(size[1]-o.style['height'])//2), size))
+						c_y += o.style['top']+o.style['height']+o.style['bottom']
+				else:
+					if o.style['position'] == 'absolute':
+						placed.append((o, pygame.Rect((left, o.style['top']), size)))
+					else:
+						placed.append((o, pygame.Rect((left, c_y+o.style['top']), size)))
+						c_y += o.style['top']+size[1]+o.style['bottom']
+			# An open select is drawn over everything else
+			if top:
+				placed.append(top)
+			self._placed = placed
+		return self._placed
+
+class FrameProfiler(object):
+	''' Times where each frame drawn by a form goes.
+	The form's methods are wrapped while it is profiled, so a form which is
+	not profiled runs exactly as normal. Each frame records the seconds of:
+		events	-> handling the events since the last frame
+		render	-> re-rendering changed objects
+		layout	-> positioning objects
+		blit	-> painting the background and objects
+		flip	-> pushing to the display
+		total	-> the whole draw
+	and under 'objects' the seconds in each object's `get_surface`, by name.
+	Objects inside a Frame are timed as part of the Frame. '''
+	PHASES = ('events', 'render', 'layout', 'blit', 'flip', 'total')
+
+	def __init__(self, form, frames=PROFILE_FRAMES, callback=None):
+		self._form = form
+		self._frames = deque(maxlen=frames)
+		self._callback = callback
+		self._frame = self._new_frame()
+		self._names = {}
+		self._patched = []
+
+	def _new_frame(self):
+		frame = dict.fromkeys(self.PHASES, 0.)
+		frame['objects'] = {}
+		return frame
+
+	def _patch(self, target, attr, function):
+		# Shadow a method with an instance attribute
+		setattr(target, attr, function)
+		self._patched.append((target, attr))
+
+	def _timed(self, phase, function):
+		def timed(*args, **kwargs):
+			start = default_timer()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				self._frame[phase] += default_timer()-start
+		return timed
+
+	def _timed_object(self, name, function):
+		def timed():
+			start = default_timer()
+			try:
+				return function()
+			finally:
+				objects = self._frame['objects']
+				objects[name] = objects.get(name, 0.)+default_timer()-start
+		return timed
+
+	def _timed_draw(self, function):
+		def timed(screen):
+			# Time objects added since the last frame
+			for name, o in self._form._objects.iteritems():
+				if o._in_frame is None and self._names.get(o) != name:
+					self._names[o] = name
+					self._patch(o, 'get_surface', self._timed_object(name, type(o).get_surface.__get__(o)))
+			start = default_timer()
+			try:
+				return function(screen)
+			finally:
+				frame, self._frame = self._frame, self._new_frame()
+				frame['total'] = default_timer()-start
+				self._frames.append(frame)
+				if self._callback:
+					self._callback(frame)
+		return timed
+
+	def attach(self):
+		''' Start timing the form '''
+		form = self._form
+		self._patch(form, '_draw', self._timed_draw(form._draw))
+		self._patch(form, '_handle', self._timed('events', form._handle))
+		self._patch(form, '_paint', self._timed('blit', form._paint))
+		self._patch(form, '_present', self._timed('flip', form._present))
+		self._patch(form._layout, 'render', self._timed('render', form._layout.render))
+		self._patch(form._layout, 'place', self._timed('layout', form._layout.place))
+
+	def detach(self):
+		''' Stop timing the form, restoring its methods '''
+		for target, attr in self._patched:
+			if attr in target.__dict__:
+				delattr(target, attr)
+		self._patched, self._names = [], {}
+
+	def frames(self):
+		''' Return the recorded frames, oldest first '''
+		return list(self._frames)
+
+	def clear(self):
+		''' Forget the recorded frames '''
+		self._frames.clear()
+
+	def summary(self, percentiles=(50, 90, 99)):
+		''' Return {phase: {'mean', 'max', 'p<n>'...}} in seconds over the recorded frames '''
+		n = len(self._frames)
+		out = {}
+		if not n:
+			return out
+		for phase in self.PHASES:
+			times = sorted([f[phase] for f in self._frames])
+			stats = {'mean': sum(times)/n, 'max': times[-1]}
+			for p in percentiles:
+				stats['p%d' % p] = times[int(round(p/100.*(n-1)))]
+			out[phase] = stats
+		return out
+
+	def worst(self, n=5):
+		''' Return the `n` objects with the most `get_surface` time over the recorded frames, as [(name, seconds)] '''
+		totals = {}
+		for f in self._frames:
+			for name, t in f['objects'].iteritems():
+				totals[name] = totals.get(name, 0.)+t
+		return sorted(totals.iteritems(), key=lambda kv: kv[1], reverse=True)[:n]
+
+class HookController(object):
+	''' The listeners of a Form's or FormObject's hooks.
+	Each hook with listeners has a precompiled tuple of calls, highest
+	priority first, so running a hook nobody listens to is one dict lookup.
+	Listeners of "__<hook>__" hooks are passed the parent as their first argument. '''
 	def __init__(self, parent):
-		dict.__init__(self)
 		self.parent = parent
+		self._listeners = {}
+		# Listeners kept by forms themselves, see watch
+		self._watchers = {}
+		self._table = {}
+		self._added = 0
+
+	def __contains__(self, hook):
+		return hook in self._table
+
+	def __len__(self):
+		return len(self._table)
+
+	def add(self, hook, function, args=(), kwargs={}, priority=0, offload=False):
+		''' Add a listener to `hook`. Equal priorities run in the order added.\nAn `offload` listener is called on the offload pool rather than the main thread. '''
+		self._added += 1
+		listeners = self._listeners.setdefault(hook, [])
+		listeners.append((-priority, self._added, function, tuple(args), dict(kwargs), offload))
+		listeners.sort()
+		self._compile(hook)
+
+	def remove(self, hook, function=None):
+		''' Remove all listeners of `hook`, or only those calling `function` '''
+		listeners = [l for l in self._listeners.pop(hook, ()) if function is not None and l[2] != function]
+		if listeners:
+			self._listeners[hook] = listeners
+		self._compile(hook)
+
+	def watch(self, hook, function, args=()):
+		''' Add a listener run after the others, which remove() leaves in place '''
+		self._watchers.setdefault(hook, []).append((function, tuple(args)))
+		self._compile(hook)
+
+	def unwatch(self, hook, function):
+		''' Remove the listeners added with watch calling `function` '''
+		watchers = [w for w in self._watchers.pop(hook, ()) if w[0] != function]
+		if watchers:
+			self._watchers[hook] = watchers
+		self._compile(hook)
+
+	def _compile(self, hook):
+		# Bind each listener's arguments up front
+		listeners = self._listeners.get(hook, [])
+		watchers = self._watchers.get(hook, [])
+		if not listeners and not watchers:
+			self._table.pop(hook, None)
+		else:
+			if hook[:2] == '__':
+				calls = [(partial(f, self.parent, *a, **k), o) for _, _, f, a, k, o in listeners]
+				calls += [(partial(f, self.parent, *a), False) for f, a in watchers]
+			else:
+				calls = [(partial(f, *a, **k), o) for _, _, f, a, k, o in listeners]
+				calls += [(partial(f, *a), False) for f, a in watchers]
+			self._table[hook] = tuple([(c, partial(offload, c, owner=self.parent))[o] for c, o in calls])
 
 	def run(self, *hooks):
-		''' Run created hooks '''
+		''' Run the listeners of each of `hooks` in turn '''
+		table = self._table
 		for hook in hooks:
-			if hook in self:
-				if hook[:2] == '__':
-					self[hook][0](self.parent, *self[hook][1], **self[hook][2])
-				elif hook[0] == '_':
-					self[hook][0](*self[hook][1], **self[hook][2])
-				return
+			if hook in table:
+				for call in table[hook]:
+					# Listeners may return a generator or future to keep running
+					r = call()
+					if r is not None:
+						start_task(r)
+
+class ChangeJournal(object):
+	''' The value changes of a form's objects, numbered in order from 1.
+	Objects are noted by their "__change_value__" hook, which runs before the
+	value changes, taking the old value of each the first time. Their new
+	values are read when the form next draws or is asked, so only objects
+	which changed are looked at. '''
+	def __init__(self, objects, size=JOURNAL_SIZE):
+		self._objects = objects
+		self._entries = deque(maxlen=size)
+		# Last value recorded of each object noted so far
+		self._values = {}
+		# Objects noted since the last flush, in the order first noted
+		self._pending = OrderedDict()
+		self.seq = 0
+
+	def track(self, name, obj):
+		''' Start tracking the form's `name` object, its value is first read when it changes '''
+		obj._hooks.watch('__change_value__', self.note, (name,))
+
+	def note(self, obj, name):
+		''' Hook listener, called before the value of `obj` (the form's `name` object) changes '''
+		if name not in self._values:
+			self._values[name] = obj.value()
+		self._pending[name] = None
+
+	def forget(self, name, obj):
+		''' Stop tracking the form's `name` object, recording any change still pending first '''
+		self.flush()
+		self._values.pop(name, None)
+		obj._hooks.unwatch('__change_value__', self.note)
+
+	def flush(self):
+		''' Record the changes of the noted objects.\nReturns the latest change number. '''
+		pending, self._pending = self._pending, OrderedDict()
+		for name in pending:
+			obj = self._objects.get(name)
+			if obj is None:
+				continue
+			old, new = self._values[name], obj.value()
+			if new != old:
+				self.seq += 1
+				self._entries.append((self.seq, name, old, new))
+				self._values[name] = new
+		return self.seq
+
+	def since(self, seq):
+		''' Return the (seq, name, old, new) entries after change number `seq`, oldest first '''
+		self.flush()
+		entries = self._entries
+		if entries and entries[0][0] > seq+1:
+			raise ValueError('Changes after %d are no longer kept, only the last %d are' % (seq, entries.maxlen))
+		new = []
+		for entry in reversed(entries):
+			if entry[0] <= seq:
+				break
+			new.append(entry)
+		new.reverse()
+		return new
+
+	def undo(self, seq):
+		''' Return {name: value} of the objects changed after change number `seq`, with the values they had then '''
+		self.flush()
+		entries = self._entries
+		if entries and entries[0][0] > seq+1:
+			raise ValueError('Values at change %d are no longer kept, only the last %d changes are' % (seq, entries.maxlen))
+		values = {}
+		for entry in reversed(entries):
+			if entry[0] <= seq:
+				break
+			values[entry[1]] = entry[2]
+		return values
 
 class Form(object):
-	def __init__(self, auto_submit=True, alpha=0, bg_color=(200,200,200,255), bg_surf=None, bg_surf_align=(0,0)):
+	def __init__(self, auto_submit=True, alpha=0, bg_color=(200,200,200,255), bg_surf=None, bg_surf_align=(0,0), dirty_rects=False):
 		''' N.B. Be very careful with transparent backgrounds!
 		Alpha:
 			-1: Fade into `color`
 			 0: Solid `color`
-			 1: Alpha `color` on `bg_surf` '''
+			 1: Alpha `color` on `bg_surf`
+		Dirty rects:
+			When True only the areas of objects which have changed are
+			repainted and pushed with `pygame.display.update(rects)`. '''
 		self._auto_submit = auto_submit
 		self._objects = {}
-		self._index = {}
+		self._index = ObjectIndex()
+		self._layout = Layout(self._objects, self._index)
 		self._selected = 0
 		self._hooks = HookController(self)
+		self._journal = ChangeJournal(self._objects)
 		self._hotspots = None
+		self._grid = None
+		self._mapped = {}
+		self._hovered = []
+		self._running = False
+		self._submitted = False
+		self._profiler = None
+		# Stand ins for objects not yet built, see FormSpec
+		self._lazy = 0
+		# Modal forms
+		self._modal = None
+		self._parent = None
+		self._backdrop = None
+		self._on_close = None
+		self._refocus = None
+		# Dirty rect settings
+		self._dirty_rects = dirty_rects
+		self._damaged = []
+		self._redraw = True
+		self._screen_size = None
+		# Precomposed translucent background
+		self._under = None
+		self._background = None
+		self._bg_key = None
+		self._fade = []
 		# Background settings
 		if alpha == 1 and bg_surf == None:
 			alpha = -1
@@ -104,7 +996,7 @@ class Form(object):
 		o = self._objects[self._index[self._selected]]
 		if not isinstance(o, Select) or not o._is_active:
 			o.blur()
-			if self._selected+1 in self._index:
+			if self._selected+1 < len(self._index):
 				self._selected += 1
 			else:
 				self._selected = 0
@@ -120,7 +1012,7 @@ class Form(object):
 		o = self._objects[self._index[self._selected]]
 		if not isinstance(o, Select) or not o._is_active:
 			o.blur()
-			if self._selected-1 in self._index:
+			if self._selected > 0:
 				self._selected -= 1
 			else:
 				self._selected = len(self._index)-1
@@ -133,79 +1025,220 @@ class Form(object):
 		# Run hook
 		self._hooks.run('__click__')
 		# Get set of actions
-		actions = [h[1]['click'] for h in self._hotspots if h[0].collidepoint(pos)]
+		actions = [h[1]['click'] for h in self._grid.at(pos) if 'click' in h[1]]
 		# Run actions
 		for a in actions:
 			a[0](*a[1], **a[2])
 
+	def _hover(self, pos):
+		# Run hook
+		self._hooks.run('__hover__')
+		# Get set of actions, hotspots are identified by their action dicts
+		over = self._grid.at(pos)
+		now = set([id(h[1]) for h in over])
+		was = set([id(h[1]) for h in self._hovered])
+		actions = [h[1]['leave'] for h in self._hovered if id(h[1]) not in now and 'leave' in h[1]]
+		actions += [h[1]['enter'] for h in over if id(h[1]) not in was and 'enter' in h[1]]
+		actions += [h[1]['hover'] for h in over if 'hover' in h[1]]
+		self._hovered = over
+		# Run actions
+		for a in actions:
+			a[0](*a[1], **a[2])
+
+	def _compose_background(self, screen):
+		''' Precompose a translucent background over what is on `screen`.
+		A fading background gets a frame for each draw of the fade. '''
+		size = screen.get_size()
+		# Keep what was under the form to compose any later background over
+		if self._backdrop is not None:
+			under = self._backdrop
+		else:
+			if self._under is None or self._under.get_size() != size:
+				self._under = screen.copy()
+			under = self._under
+		# A solid form over a backdrop shows just the backdrop
+		if self._alpha == 0:
+			self._fade = []
+			self._background = under
+			return
+		overlay = pygame.Surface(size).convert_alpha()
+		overlay.fill(self._bg_color)
+		solid = pygame.Surface(size).convert()
+		solid.fill(self._bg_color[:3])
+		# The n-th draw of a fade has the overlay blended over the screen n times,
+		# ending on the solid colour
+		alpha = (255, self._bg_color[3])[len(self._bg_color) > 3]/255.
+		frames = (1, FADE_FRAMES)[self._alpha == -1]
+		self._fade = []
+		for n in xrange(frames):
+			faded = int(round(255*(1-(1-alpha)**n)))
+			if n == FADE_FRAMES-1:
+				faded = 255
+			surf = under.copy()
+			solid.set_alpha(faded)
+			surf.blit(solid, (0,0))
+			if self._bg_surf:
+				surf.blit(self._bg_surf, self._bg_surf_align)
+			surf.blit(overlay, (0,0))
+			self._fade.append(surf)
+			if faded == 255:
+				break
+		self._background = self._fade[-1]
+
+	def _paint_background(self, screen, area=None):
+		''' Paint the form background over `area` (or the whole screen) '''
+		if self._alpha == 0 and self._backdrop is None:
+			screen.fill(self._bg_color, area)
+		elif self._fade and not area:
+			# Show the next frame of a fade
+			screen.blit(self._fade.pop(0), (0,0))
+		else:
+			screen.blit(self._background, area or (0,0), area)
+
 	def _draw(self, screen):
+		''' Draw the form, returning a list of the screen areas updated. '''
 		# Run hook
 		self._hooks.run('__draw__')
 		# Make sure the form has objects
 		if not len(self._objects):
 			raise AttributeError('Form has no objects.')
-		if abs(self._alpha) == 1:
-			if self._bg_surf:
-				screen.blit(self._bg_surf, self._bg_surf_align)
-			surf = pygame.Surface(screen.get_size()).convert_alpha()
-			surf.fill(self._bg_color)
-			screen.blit(surf, (0,0))
-			if self._alpha == 1:
-				self._alpha += 1
-		elif self._alpha == 0:
-			screen.fill(self._bg_color)
-		c_y = 20
-		blit_top, top_o = None, None
-		self._hotspots = []
-		for i in xrange(0, len(self._objects)):
-			o = self._objects[self._index[i]]
-			if o._in_frame:
-				continue
-			s = o.get_surface()
-			left = (o.style['left'],(screen.get_width()-s.get_width())//2)[o.style['left']=='center']
-			if isinstance(o, Select) and o._is_active:
-				if o.style['position'] == 'absolute':
-					blit_top = [s, (left, o.style['top']-(s.get_height()-o.style['height'])//2)]
-					top_o = o
-				else:
-					blit_top = [s, (left, o.style['top']+c_y-(s.get_height()-o.style['height'])//2)]
-					top_o = o
-					c_y += o.style['top']+o.style['height']+o.style['bottom']
-			else:
-				if o.style['position'] == 'absolute':
-					rect = screen.blit(s, (left, o.style['top']))
+		# Advance running actions and any time based object state
+		if _TASKS_ or _OFFLOADED_:
+			poll_tasks()
+		for o in self._objects.itervalues():
+			o._tick()
+		# Translucent backgrounds and backdrops are composed once for each screen size and background
+		if self._alpha != 0 or self._backdrop is not None:
+			key = (screen.get_size(), self._bg_color, self._bg_surf, self._bg_surf_align, self._backdrop)
+			if key != self._bg_key:
+				self._bg_key = key
+				self._compose_background(screen)
+				self._redraw = True
+		# Fading backgrounds change every frame so always need a full repaint
+		full = not self._dirty_rects or self._redraw or self._fade or screen.get_size() != self._screen_size
+		# Render objects which have changed, positioning them again only if one has moved
+		self._layout.render()
+		placed = self._layout.place(screen.get_width(), 20)
+		# Build stand in objects which have come into view, placing again now their sizes are known
+		while self._lazy:
+			view = screen.get_rect()
+			shown = [o for o, rect in placed if isinstance(o, LazyObject) and rect.colliderect(view)]
+			if not shown:
+				break
+			for o in shown:
+				o.realize()
+			self._layout.render()
+			placed = self._layout.place(screen.get_width(), 20)
+		damaged = self._paint(screen, placed, full)
+		self._present(damaged, full)
+		# Remember what was drawn
+		self._redraw = False
+		self._screen_size = screen.get_size()
+		for o in self._objects.itervalues():
+			o._dirty = False
+		# Record the values changed since the last frame
+		if self._journal._pending:
+			self._journal.flush()
+		# Rebuild hotspots only when the layout or a frame's hotspots change
+		for o, rect in placed:
+			if rect != o._rect or isinstance(o, Frame) and o._hotspots is not self._mapped.get(o):
+				self._grid = None
+			o._rect = rect
+		if self._grid is None:
+			self._hotspots, self._mapped = [], {}
+			for o, rect in placed:
+				if isinstance(o, Frame):
+					self._hotspots.extend([(h[0].move(rect.topleft), h[1]) for h in o._hotspots])
+					self._mapped[o] = o._hotspots
 				else:
-					rect = screen.blit(s, (left, c_y+o.style['top']))
-					c_y += o.style['top']+s.get_height()+o.style['bottom']
-			if isinstance(o, Frame):
-				m = (left, o.style['top'])
-				for h in o._hotspots:
-					h[0].move_ip(*m)
-				self._hotspots.extend(o._hotspots)
-			else:
-				hs = o.hotspots()
-				if hs:
-					self._hotspots.append((rect, hs))
-		if blit_top:
-			rect = screen.blit(*blit_top)
-			hs = top_o.hotspots()
-			if hs:
-				self._hotspots.append((rect, hs))
-		if self._flip:
+					hs = o.hotspots()
+					if hs:
+						self._hotspots.append((rect, hs))
+			self._grid = HotspotGrid(self._hotspots)
+		return damaged
+
+	def _paint(self, screen, placed, full):
+		''' Paint the placed objects, everything or only what changed, returning the areas painted '''
+		if full:
+			# Repaint everything
+			self._paint_background(screen)
+			for o, rect in placed:
+				screen.blit(o.get_surface(), rect)
+			damaged = [screen.get_rect()]
+		else:
+			# Find the old and new areas of objects which have changed
+			damaged, self._damaged = self._damaged, []
+			for o, rect in placed:
+				if o._dirty or rect != o._rect:
+					if o._rect and o._rect != rect:
+						damaged.append(o._rect)
+					damaged.append(rect)
+			# Repaint only the damaged areas
+			for area in damaged:
+				screen.set_clip(area)
+				self._paint_background(screen, area)
+				for o, rect in placed:
+					if rect.colliderect(area):
+						screen.blit(o.get_surface(), rect)
+			screen.set_clip(None)
+		return damaged
+
+	def _present(self, damaged, full):
+		''' Push the painted areas to the display '''
+		if not self._flip:
+			return
+		if full:
 			pygame.display.flip()
-
-	def add_hook(self, name, function, args=(), kwargs={}):
-		self._hooks[name] = (function, args, kwargs)
-
-	def rem_hook(self, name):
-		if name in self._hooks:
-			del self._hooks[name]
+		elif damaged:
+			pygame.display.update(damaged)
+
+	def refresh(self):
+		''' Force a full repaint on the next draw. '''
+		self._redraw = True
+
+	def surface_stats(self):
+		''' Return the surface cache hit/miss counts summed over all objects. '''
+		stats = {'hits': 0, 'misses': 0}
+		for o in self._objects.itervalues():
+			for k, v in o.surface_stats().iteritems():
+				stats[k] += v
+		return stats
+
+	def enable_profiling(self, frames=PROFILE_FRAMES, callback=None):
+		''' Start timing each frame drawn, keeping the last "frames".\nReturns the FrameProfiler recording them.\n\n"callback" is called with the record of each frame as it is finished, e.g. to export them. '''
+		self.disable_profiling()
+		self._profiler = FrameProfiler(self, frames, callback)
+		self._profiler.attach()
+		return self._profiler
+
+	def disable_profiling(self):
+		''' Stop timing frames.\nReturns the FrameProfiler which was recording, or None. '''
+		profiler, self._profiler = self._profiler, None
+		if profiler:
+			profiler.detach()
+		return profiler
+
+	def add_hook(self, name, function, args=(), kwargs={}, priority=0, offload=False):
+		''' Call function(form, *args, **kwargs) each time the "name" hook runs.\nHooks can have many functions, higher "priority" ones run first.\nWhen "offload" is True the function is called on the offload pool, see offload(). '''
+		self._hooks.add(name, function, args, kwargs, priority, offload)
+
+	def rem_hook(self, name, function=None):
+		''' Remove all functions hooked to "name", or only "function". '''
+		self._hooks.remove(name, function)
 
 	def get_value(self, name):
 		if not name in self._objects:
 			raise KeyError('Form does not contain a "%s" object' % name)
 		return self._objects[name].value()
 
+	def changes(self, since=0):
+		''' Return the value changes made after change number "since", oldest first, as a list of (number, name, old value, new value).\nPass the last number seen to get only newer changes, see last_change.\nRaises ValueError if changes after "since" are no longer kept, see JOURNAL_SIZE. '''
+		return self._journal.since(since)
+
+	def last_change(self):
+		''' Return the number of the latest value change, 0 if there are none. '''
+		return self._journal.flush()
+
 	def clear(self):
 		# Run hook
 		self._hooks.run('__clear__')
@@ -216,63 +1249,173 @@ class Form(object):
 	def submit(self):
 		# Stop running
 		self._running = False
+		self._submitted = True
+		self._drop_offloaded()
+
+	def _drop_offloaded(self):
+		# Cancel the form's unfinished offloaded actions, finishing them now
+		# as their DONE_EVENT may never be handled
+		if _OFFLOADED_:
+			owners = set(map(id, self._objects.itervalues()))
+			owners.add(id(self))
+			for task in list(_OFFLOADED_):
+				if id(task.owner) in owners:
+					task.cancel()
+					_finish_offloaded(task)
+
+	def open_modal(self, screen, form, dim=MODAL_DIM, callback=None):
+		''' Shows "form" over this form, which stays shown dimmed by "dim" behind it.\nUntil "form" is submitted or close_modal is called, events given to this form go to "form".\n"callback" is called with the modal's FormResult when it closes. '''
+		if self._modal is not None:
+			raise ValueError('Form already has a modal form open.')
+		# This form's object loses focus until the modal closes
+		if len(self._index):
+			o = self._objects[self._index[self._selected]]
+			if o._has_focus:
+				o.blur()
+				self._refocus = o
+		# Snapshot this form once as the modal's static backdrop
+		flip, self._flip = self._flip, False
+		self.refresh()
+		self._draw(screen)
+		self._flip = flip
+		backdrop = screen.copy()
+		if dim:
+			shade = pygame.Surface(screen.get_size()).convert()
+			shade.fill(dim[:3])
+			shade.set_alpha((255, dim[3])[len(dim) > 3])
+			backdrop.blit(shade, (0,0))
+		form._backdrop = backdrop
+		form._parent = self
+		form._submitted = False
+		form.refresh()
+		self._modal = form
+		self._on_close = callback
+
+	def close_modal(self):
+		''' Closes the open modal form, giving focus back to this form.\nReturns the modal's FormResult, or None if no modal was open. '''
+		form, self._modal = self._modal, None
+		if form is None:
+			return None
+		# Close any modal open on the modal
+		form.close_modal()
+		if len(form._index):
+			o = form._objects[form._index[form._selected]]
+			if o._has_focus:
+				o.blur()
+		form._backdrop = form._parent = None
+		form._bg_key = None
+		# Give focus back
+		o, self._refocus = self._refocus, None
+		if o is not None and not o._has_focus:
+			o.focus()
+		self.refresh()
+		result = FormResult(form._objects, form._journal)
+		callback, self._on_close = self._on_close, None
+		if callback:
+			callback(result)
+		return result
+
+	def run_modal(self, screen, form, dim=MODAL_DIM, wait=False):
+		''' Runs "form" over this form, which stays shown dimmed by "dim" behind it, blocking until "form" is submitted.\nReturns the modal's FormResult. '''
+		self.open_modal(screen, form, dim)
+		try:
+			form.run(screen, wait)
+		finally:
+			result = self.close_modal()
+		return result
+
+	def _update_modal(self, screen, events):
+		# Pass events to the open modal form, closing it once submitted
+		form = self._modal
+		damaged = form.update_events(screen, events)
+		if damaged is None:
+			self._running = False
+			return None
+		if form._submitted:
+			self.close_modal()
+			return self._draw(screen)
+		return damaged
+
+	def _flatten(self, name, obj):
+		# The object followed by all objects inside it
+		objects = [(name, obj)]
+		if isinstance(obj, Frame):
+			for n in obj._index:
+				objects.extend(self._flatten(n, obj._objects[n]))
+		return objects
 
 	def add_object(self, name, obj, index=None):
 		''' Add object to Form with reference "name". '''
-		if name not in self._objects:
-			# Add object reference
-			self._objects[name] = obj
-			# Add object index
-			if not index or index >= len(self._index):
-				index = len(self._index)
-				self._index[index] = name
-			else:
-				for i in xrange(index, len(self._index)-1):
-					self._index[i+1] = self._index[i]
-				self._index[index] = name
-			# Add all containing objects
-			if isinstance(obj, Frame):
-				for j in xrange(len(obj._index)):
-					n = obj._index[j]
-					self.add_object(n, obj._objects[n], index+j+1)
-		else:
-			raise ValueError('Form object already contains a "%s" object' % name)
+		self.add_objects([(name, obj)], index)
+
+	def add_objects(self, objects, index=None):
+		''' Add a list of (name, object) pairs to Form in one go. '''
+		# Include all containing objects
+		flat = []
+		for name, obj in objects:
+			flat.extend(self._flatten(name, obj))
+		names = [n for n, _ in flat]
+		seen = set()
+		for name in names:
+			if name in self._objects or name in seen:
+				raise ValueError('Form object already contains a "%s" object' % name)
+			seen.add(name)
+		# Add object references
+		self._objects.update(flat)
+		for name, obj in flat:
+			self._journal.track(name, obj)
+		for name, obj in objects:
+			obj._in_layout = self._layout
+		self._layout.reset()
+		self._grid = None
+		# Add object index
+		if index is None or index >= len(self._index):
+			index = len(self._index)
+		elif index <= self._selected:
+			self._selected += len(names)
+		self._index.insert(index, names)
 
 	def rem_object(self, name):
-		''' Removes object initialized with "name" from the form.\n\nN.B. This is currently a slow, cpu heavy, operation. '''
+		''' Removes object initialized with "name" from the form. '''
 		if name in self._objects:
 			# Remove all containing objects
 			if isinstance(self._objects[name], Frame):
-				for _,n in self._objects[name]._index.iteritems():
+				for n in list(self._objects[name]._index):
 					self.rem_object(n)
 			# Update parent
 			parent = self._objects[name]._in_frame
 			if parent:
 				parent.rem_object(name)
+			# Repaint the area it covered
+			elif self._objects[name]._rect:
+				self._damaged.append(self._objects[name]._rect)
+			self._objects[name]._in_layout = None
+			self._grid = None
+			# Stop journaling its value
+			self._journal.forget(name, self._objects[name])
 			# Delete object
 			self._objects.__delitem__(name)
-			# Update indexes
-			x = dict([(v, k) for (k, v) in self._index.iteritems()])[name]
-			for i in xrange(x+1, len(self._index)-1):
-				self._index[i] = self._index[i+1]
-			# Remove index
-			self._index.__delitem__(i+1)
-			# Check that the removed item wasn't selected
-			if self._selected >= len(self._index):
-				self._selected = len(self._index)-1
+			# Update index
+			x = self._index.remove(name)
+			self._layout.reset()
+			# Keep the selection on the same object or in range
+			if x < self._selected or self._selected >= len(self._index):
+				self._selected = max(self._selected-1, 0)
 		else:
 			raise KeyError('Form object does not contain a "%s" object' % name)
 
-	def update(self, screen, e):
-		''' Runs event on form and then displays to screen. '''
-		# Run hook
-		self._hooks.run('__update__')
-		# Do update
+	def _handle(self, e):
+		''' Runs event on form without drawing.\nReturns False if the form was quit. '''
 		if e.type == PL.QUIT:
 			self._running = False
-			return None
-		elif e.type == PL.MOUSEBUTTONUP and self._hotspots:
+			return False
+		elif e.type == DONE_EVENT and hasattr(e, 'task'):
+			# Finish an offloaded action on the main thread
+			_finish_offloaded(e.task)
+		elif e.type == PL.MOUSEBUTTONUP and self._grid:
 			self._click(e.pos)
+		elif e.type == PL.MOUSEMOTION and self._grid:
+			self._hover(e.pos)
 		elif e.type == PL.KEYDOWN:
 			# Move between objects
 			if e.key == PL.K_TAB:
@@ -287,40 +1430,175 @@ class Form(object):
 			# Submit form
 			elif e.key == PL.K_RETURN and self._auto_submit:
 				self.submit()
+		return True
+
+	def update(self, screen, e):
+		''' Runs event on form and then displays to screen.\nReturns the list of screen areas updated. '''
+		# Send events to an open modal form
+		if self._modal is not None:
+			return self._update_modal(screen, [e])
+		# Run hook
+		self._hooks.run('__update__')
+		# Do update
+		if not self._handle(e):
+			return None
+		# Draw the modal form if the event opened one
+		if self._modal is not None:
+			return self._update_modal(screen, [])
 		# Draw the form
-		self._draw(screen)
+		return self._draw(screen)
+
+	def update_events(self, screen, events=None):
+		''' Runs all queued events (or "events") on form, coalescing redundant ones, and then displays to screen once.\nReturns the list of screen areas updated. '''
+		if events is None:
+			events = pygame.event.get()
+		# Send events to an open modal form
+		if self._modal is not None:
+			return self._update_modal(screen, events)
+		# Run hook
+		self._hooks.run('__update__')
+		# Do update
+		running = self._running
+		events = coalesce_events(events)
+		for i, e in enumerate(events):
+			if not self._handle(e):
+				return None
+			# The rest of the events go to a modal form an action opened
+			if self._modal is not None:
+				return self._update_modal(screen, events[i+1:])
+			# Stop at a submit
+			if running and not self._running or self._parent and self._submitted:
+				break
+		# Draw the form
+		return self._draw(screen)
+
+	def _deadline(self):
+		''' Return the time of the next timed change to any object, or None '''
+		if self._modal is not None:
+			return self._modal._deadline()
+		times = [t for t in [o._deadline() for o in self._objects.itervalues()] if t is not None]
+		# Running actions are advanced every frame
+		if _TASKS_:
+			times.append(time.time()+1./FPS)
+		elif _OFFLOADED_:
+			times.append(time.time()+OFFLOAD_POLL)
+		if times:
+			return min(times)
+		return None
 
-	def run(self, screen):
-		''' Displays the form on "screen" blocking the script until the form is submitted.\nReturns a FormResult object. '''
+	def run(self, screen, wait=False):
+		''' Displays the form on "screen" blocking the script until the form is submitted.\nReturns a FormResult object.\n\nWhen "wait" is True the form sleeps until there is input or a cursor flash or image frame is due, instead of polling at FPS. '''
 		# Make sure the form has objects
 		if not len(self._objects):
 			raise AttributeError('Form has no objects.')
 		if self._objects[self._index[self._selected]]._tab_skip:
 			self._next()
+		# Only queue events the form uses, keeping those already queued as
+		# blocking an event type can flush the queue
+		events = pygame.event.get()
+		blocked = [t for t in _IGNORED_EVENTS_ if not pygame.event.get_blocked(t)]
+		if blocked:
+			pygame.event.set_blocked(blocked)
 		# Loopdy-loop
 		self._running = True
-		self._draw(screen)
-		while self._running:
-			# Show next image frame
-			for i in _IMAGES_:
-				i._next()
-			# Run events and draw form
-			self.update(screen, pygame.event.poll())
-			# Limit FPS
-			_CLOCK_.tick(FPS)
-		return FormResult(self._objects)
-
-class FormResult(dict):
-	def __init__(self, objects):
-		dict.__init__(self)
-		for name, obj in objects.iteritems():
-			val = obj.value()
-			if val:
-				self.__setattr__(name, val)
-				self[name] = val
+		try:
+			self._draw(screen)
+			while self._running:
+				if wait and not events:
+					# Sleep until there is input or something is due
+					deadline = self._deadline()
+					e = wait_event(deadline)
+					# A wake timer can fire a little early, with nothing yet to draw
+					if e.type in (PL.NOEVENT, WAKE_EVENT) and deadline is not None and time.time() < deadline:
+						continue
+					events = [e]
+				# Run all queued events and draw form
+				self.update_events(screen, events+pygame.event.get())
+				events = []
+				# Limit FPS
+				_CLOCK_.tick(FPS)
+		finally:
+			# Restore the event queue and drop unfinished offloaded actions, even when an action raised
+			if blocked:
+				pygame.event.set_allowed(blocked)
+			self._drop_offloaded()
+		return FormResult(self._objects, self._journal)
+
+class FormResult(Mapping):
+	''' The values of a form's objects when the result was made, as a read only
+	mapping and as attributes, of the objects which have a value.
+	Values are only read when asked for. Objects changed since are given the
+	value they had from the form's change journal, reading a value raises
+	ValueError once the journal no longer keeps it. '''
+	def __init__(self, objects, journal=None):
+		self._objects = dict(objects)
+		self._journal = journal
+		self._seq = 0
+		if journal is not None:
+			self._seq = journal.flush()
+		self._values = {}
+		self._undone = None
+
+	def _undo(self):
+		# The values of objects changed since the result was made, found
+		# again only when there are newer changes
+		if self._journal is None:
+			return {}
+		seq = self._journal.flush()
+		if self._undone is None or self._undone[0] != seq:
+			self._undone = (seq, self._journal.undo(self._seq))
+		return self._undone[1]
+
+	def _read(self, name):
+		# Read each value once
+		if name not in self._values:
+			undo = self._undo()
+			if name in undo:
+				self._values[name] = undo[name]
+			else:
+				self._values[name] = self._objects[name].value()
+		return self._values[name]
+
+	def __getitem__(self, name):
+		if name not in self._objects or not self._read(name):
+			raise KeyError(name)
+		return self._values[name]
+
+	def __getattr__(self, name):
+		if name[:1] == '_':
+			raise AttributeError(name)
+		try:
+			return self[name]
+		except KeyError:
+			raise AttributeError('FormResult has no "%s" value' % name)
+
+	def __iter__(self):
+		# Knowing which objects have a value needs every value
+		return iter([name for name in self._objects if self._read(name)])
+
+	def __len__(self):
+		return len([name for name in self._objects if self._read(name)])
+
+	def __repr__(self):
+		return repr(dict(self.iteritems()))
 
 class FormObject(object):
 	''' A base used for most form objects '''
+	# Attributes which change the appearance of the object when set
+	_watch = frozenset(['_value', '_has_focus', 'style'])
+	# Watched attributes which can also move the object
+	_reflow = frozenset(['style'])
+	_dirty = True
+	_owner = None
+	# The Layout positioning the object and its rect within its container
+	_in_layout = None
+	_rect = None
+	# Rendered surface cache
+	_surface = None
+	_spent = None
+	_hits = 0
+	_misses = 0
+
 	def __init__(self, value):
 		self._value = self._default = value
 		self._has_focus = False
@@ -328,6 +1606,68 @@ class FormObject(object):
 		self._in_frame = None
 		self._hooks = HookController(self)
 
+	def __setattr__(self, name, value):
+		if name == 'style' and not isinstance(value, Style):
+			value = Style(self, value)
+		if name in self._watch and self.__dict__.get(name, _MISSING_) != value:
+			object.__setattr__(self, name, value)
+			if name in self._reflow:
+				self._restyled()
+			else:
+				self._changed()
+		else:
+			object.__setattr__(self, name, value)
+
+	def _changed(self):
+		''' Flag the object (and whatever contains it) as needing a redraw '''
+		self.__dict__['_dirty'] = True
+		if self._surface is not None:
+			self.__dict__['_spent'] = self._surface
+			self.__dict__['_surface'] = None
+		if self._owner is not None:
+			self._owner._child_changed(self)
+
+	def _child_changed(self, child):
+		''' Called when `child`, an object contained in this one, has changed '''
+		self._changed()
+
+	def _restyled(self):
+		''' Flag the object as needing a redraw and its container as needing a new layout '''
+		if self._in_layout is not None:
+			self._in_layout.invalidate()
+		self._changed()
+
+	def _tick(self):
+		''' Advance any time based state, called by the form before each draw '''
+		pass
+
+	def _deadline(self):
+		''' Return the time the object next changes by itself, or None '''
+		return None
+
+	def _render(self):
+		''' Create a new surface showing the object '''
+		raise NotImplementedError
+
+	def get_surface(self):
+		''' Return the rendered object, only re-rendering after a change.
+		The surface is reused once the object has changed so should not be kept. '''
+		if self._surface is None:
+			self._misses += 1
+			self._surface = self._render()
+			# Give the old surface back for reuse
+			if self._spent is not None:
+				if self._spent is not self._surface:
+					_SURFACES_.put(self._spent)
+				self._spent = None
+		else:
+			self._hits += 1
+		return self._surface
+
+	def surface_stats(self):
+		''' Return the surface cache hit/miss counts '''
+		return {'hits': self._hits, 'misses': self._misses}
+
 	def _reset(self):
 		''' Restore value to default '''
 		# Run hook
@@ -335,15 +1675,18 @@ class FormObject(object):
 		self._value = self._default
 
 	def hotspots(self):
-		''' Return a dict of {event -> action} or None '''
+		''' Return a dict of {event -> action} or None
+		Events: 'click', 'enter', 'leave', 'hover'
+		The same dict should be returned each time as hover state is tracked by it. '''
 		return None
 
-	def add_hook(self, name, function, args):
-		self._hooks[name] = (function, args)
+	def add_hook(self, name, function, args=(), kwargs={}, priority=0, offload=False):
+		''' Call function(object, *args, **kwargs) each time the "name" hook runs.\nHooks can have many functions, higher "priority" ones run first.\nWhen "offload" is True the function is called on the offload pool, see offload(). '''
+		self._hooks.add(name, function, args, kwargs, priority, offload)
 
-	def rem_hook(self, name):
-		if name in self._hooks:
-			del self._hooks[name]
+	def rem_hook(self, name, function=None):
+		''' Remove all functions hooked to "name", or only "function". '''
+		self._hooks.remove(name, function)
 
 	def update(self, e):
 		''' Deal with events '''
@@ -388,28 +1731,106 @@ class Seperator(FormObject):
 	def value(self):
 		return None
 
-	def get_surface(self):
+	def _render(self):
 		# Create surface
-		line = pygame.Surface((self._width, self._size)).convert_alpha()
+		line = _SURFACES_.get((self._width, self._size))
 		# Add box
 		line.fill(self._color)
 		return line
 
+class SpriteSheet(object):
+	''' Frames cut from a sheet image, left to right then top to bottom.
+		sheet	-> a Surface or an image file name
+		size	-> (width, height) of each frame
+		count	-> number of frames, if the sheet is not full '''
+	def __init__(self, sheet, size, count=None):
+		if not isinstance(sheet, pygame.Surface):
+			sheet = pygame.image.load(sheet)
+		self._sheet = sheet
+		self._size = size
+		self._columns = sheet.get_width()//size[0]
+		full = self._columns*(sheet.get_height()//size[1])
+		self._count = (min(count, full), full)[count is None]
+
+	def __len__(self):
+		return self._count
+
+	def __getitem__(self, i):
+		if not 0 <= i < self._count:
+			raise IndexError('SpriteSheet index out of range')
+		w, h = self._size
+		return self._sheet.subsurface(((i%self._columns)*w, (i//self._columns)*h, w, h))
+
+class FrameDirectory(object):
+	''' Frames loaded from the image files in a directory, in name order '''
+	def __init__(self, path):
+		self._files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS]
+
+	def __len__(self):
+		return len(self._files)
+
+	def __getitem__(self, i):
+		surf = pygame.image.load(self._files[i])
+		if pygame.display.get_surface():
+			surf = surf.convert_alpha()
+		return surf
+
+class FrameStream(object):
+	''' Frames read in order from an iterator.
+	Given a function returning an iterator the stream is restarted to loop,
+	otherwise it plays once. '''
+	def __init__(self, frames):
+		self._factory = (None, frames)[callable(frames)]
+		self._iter = iter(frames() if self._factory else frames)
+		self._pos = 0
+
+	def __getitem__(self, i):
+		if i < self._pos:
+			if self._factory is None:
+				raise IndexError('FrameStream can not be rewound')
+			self._iter, self._pos = iter(self._factory()), 0
+		try:
+			while self._pos < i:
+				next(self._iter)
+				self._pos += 1
+			frame = next(self._iter)
+		except StopIteration:
+			raise IndexError('FrameStream index out of range')
+		self._pos += 1
+		return frame
+
 class Image(FormObject):
-	def __init__(self, images, start=0, auto_scroll=True, int_align=('center','center'), **kwargs):
+	''' Shows an image, or an animation of frames.
+		images		-> a Surface, a sequence of frames, a SpriteSheet, a
+					   directory name, an iterator of frames or a function
+					   returning one. Each frame is a Surface or a
+					   (Surface, seconds) pair.
+		durations	-> seconds each frame is shown, one number for all
+					   frames or a sequence (defaults to 1/FPS)
+		max_bytes	-> size of the decoded frame cache '''
+	_watch = FormObject._watch | frozenset(['_index'])
+
+	def __init__(self, images, start=0, auto_scroll=True, int_align=('center','center'), durations=None, max_bytes=IMAGE_CACHE_SIZE, **kwargs):
 		# Initialise as a form object
 		FormObject.__init__(self, None)
 		self._tab_skip = True
-		# Register as an updating image
-		if auto_scroll:
-			global _IMAGES_
-			_IMAGES_.append(self)
-		# Store some info
-		try:
-			self._images = list(images)
-		except TypeError:
-			self._images = [images]
+		# Images which auto scroll are stepped by _tick
+		self._auto_scroll = auto_scroll
+		# Store the frame source
+		if isinstance(images, pygame.Surface):
+			images = [images]
+		elif isinstance(images, basestring):
+			images = FrameDirectory(images)
+		elif not hasattr(images, '__getitem__'):
+			images = FrameStream(images)
+		self._images = images
+		self._durations = (durations, 1./FPS)[durations is None]
+		# Decoded frame cache
+		self._frames = OrderedDict()
+		self._bytes = 0
+		self._max_bytes = max_bytes
 		self._index = start
+		self._due = None
 		self._int_align = int_align
 		# Default box styles
 		self.style = {
@@ -432,25 +1853,72 @@ class Image(FormObject):
 			if s in self.style:
 				self.style[s] = v
 
+	def _frame(self, i):
+		''' Return frame `i` as (surface, seconds), decoding it if it is not cached '''
+		frame = self._frames.pop(i, None)
+		if frame is None:
+			frame = self._images[i]
+			if isinstance(frame, pygame.Surface):
+				if hasattr(self._durations, '__getitem__'):
+					frame = (frame, self._durations[i%len(self._durations)])
+				else:
+					frame = (frame, self._durations)
+			self._bytes += frame[0].get_width()*frame[0].get_height()*frame[0].get_bytesize()
+		# Most recently used frames are kept at the end
+		self._frames[i] = frame
+		while self._bytes > self._max_bytes and len(self._frames) > 1:
+			_, old = self._frames.popitem(False)
+			self._bytes -= old[0].get_width()*old[0].get_height()*old[0].get_bytesize()
+		return frame
+
 	def _next(self):
 		# Run hook
 		self._hooks.run('__change_value__')
-		# Do next
-		self._index += 1
-		if self._index >= len(self._images):
-			self._index = 0
+		# Do next, going back to the start after the last frame
+		try:
+			duration = self._frame(self._index+1)[1]
+			self._index += 1
+		except IndexError:
+			try:
+				duration = self._frame(0)[1]
+				self._index = 0
+			except IndexError:
+				# A stream which can not be replayed stays on its last frame
+				duration = self._frame(self._index)[1]
+		# Keep to the frame timing unless it has fallen behind
+		now = time.time()
+		due = (self._due, now)[self._due is None]+duration
+		self._due = (due, now+duration)[due < now]
+
+	def _tick(self):
+		if not self._auto_scroll:
+			return
+		if self._due is None:
+			# Start timing from the first frame shown
+			try:
+				self._due = time.time()+self._frame(self._index)[1]
+			except IndexError:
+				pass
+		elif time.time() >= self._due:
+			self._next()
+
+	def _deadline(self):
+		if self._auto_scroll:
+			return self._due
+		return None
 
 	def value(self):
 		return None
 
-	def get_surface(self):
-		# Make sure the frame has objects
-		if not len(self._images):
+	def _render(self):
+		# Make sure the image has frames
+		try:
+			img = self._frame(self._index)[0]
+		except IndexError:
 			raise AttributeError('Image has no images.')
-		img = self._images[self._index]
 		width = (img.get_width(),self.style['width'])[self.style['width']!=None]
 		height = (img.get_height(),self.style['height'])[self.style['height']!=None]
-		surf = pygame.Surface((width, height)).convert_alpha()
+		surf = _SURFACES_.get((width, height))
 		surf.fill(self.style['bg_color'])
 		if self.style['border_width'] > 0:
 			pygame.draw.rect(surf, self.style['border_color'], (0, 0, width-self.style['border_width']//2, height-self.style['border_width']//2), self.style['border_width'])
@@ -460,6 +1928,7 @@ class Image(FormObject):
 		return surf
 
 class Frame(FormObject):
+	''' A box of objects composited onto one retained surface '''
 	def __init__(self, size, pos, **kwargs):
 		# Initialise as a form object
 		FormObject.__init__(self, None)
@@ -467,8 +1936,14 @@ class Frame(FormObject):
 		# Store some info
 		self.position = pos
 		self._objects = {}
-		self._index = {}
+		self._index = ObjectIndex()
+		self._layout = Layout(self._objects, self._index, self)
 		self._hotspots = None
+		# Composite cache
+		self._composite = None
+		self._placed = None
+		self._stale = set()
+		self._mapped = {}
 		# Default box styles
 		self.style = {
 			# Appearance
@@ -494,78 +1969,98 @@ class Frame(FormObject):
 		return None
 
 	def add_object(self, name, obj, index=None):
-		''' Add object to Form with reference "name". '''
-		if name not in self._objects:
+		''' Add object to Frame with reference "name". '''
+		self.add_objects([(name, obj)], index)
+
+	def add_objects(self, objects, index=None):
+		''' Add a list of (name, object) pairs to Frame in one go. '''
+		names = [n for n, _ in objects]
+		seen = set()
+		for name in names:
+			if name in self._objects or name in seen:
+				raise ValueError('Form object already contains a(n) "%s" object' % name)
+			seen.add(name)
+		for name, obj in objects:
 			# Reference as child
-			obj._in_frame = self
+			obj._in_frame = obj._owner = self
+			obj._in_layout = self._layout
 			# Add object reference
 			self._objects[name] = obj
-			# Add object index
-			if not index or index >= len(self._index):
-				self._index[len(self._index)] = name
-			else:
-				for i in xrange(index, len(self._index)-1):
-					self._index[i+1] = self._index[i]
-				self._index[index] = name
-		else:
-			raise ValueError('Form object already contains a(n) "%s" object' % name)
+		self._layout.reset()
+		self._changed()
+		# Add object index
+		if index is None or index >= len(self._index):
+			index = len(self._index)
+		self._index.insert(index, names)
 
 	def rem_object(self, name):
-		''' Removes object initialized with "name" from the form.\n\nN.B. This is currently a slow, cpu heavy, operation. '''
+		''' Removes object initialized with "name" from the frame. '''
 		if name in self._objects:
 			# Delete object
+			self._objects[name]._owner = self._objects[name]._in_layout = None
 			self._objects.__delitem__(name)
-			# Update indexes
-			x = dict([(v, k) for (k, v) in self._index.iteritems()])[name]
-			for i in xrange(x+1, len(self._index)-1):
-				self._index[i] = self._index[i+1]
-			# Remove index
-			self._index.__delitem__(i+1)
-			# Check that the removed item wasn't selected
-			if self._selected >= len(self._index):
-				self._selected = len(self._index)-1
+			self._layout.reset()
+			self._changed()
+			# Update index
+			self._index.remove(name)
 		else:
 			raise KeyError('Form object does not contain a(n) "%s" object' % name)
 
-	def get_surface(self):
+	def _child_changed(self, child):
+		# Only the child's area needs compositing again
+		self._stale.add(child)
+		self._changed()
+
+	def _restyled(self):
+		# The whole frame needs compositing again
+		self._placed = None
+		FormObject._restyled(self)
+
+	def _render(self):
 		# Make sure the frame has objects
 		if not len(self._objects):
 			raise AttributeError('Frame has no objects.')
-		surf = pygame.Surface((self.style['width'], self.style['height'])).convert_alpha()
-		surf.fill(self.style['bg_color'])
-		if self.style['border_width'] > 0:
-			pygame.draw.rect(surf, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, self.style['height']-self.style['border_width']//2), self.style['border_width'])
-		c_y = self.style['border_width']
-		blit_top, top_o = None, None
-		self._hotspots = []
-		for i in xrange(0, len(self._objects)):
-			o = self._objects[self._index[i]]
-			if o._in_frame and o._in_frame != self:
-				continue
-			s = o.get_surface()
-			left = (o.style['left'],(surf.get_width()-s.get_width())//2)[o.style['left']=='center']
-			if isinstance(o, Select) and o._is_active:
-				if o.style['position'] == 'absolute':
-					blit_top = [s, (left, o.style['top']-(s.get_height()-o.style['height'])//2)]
-					top_o = o
-				else:
-					blit_top = [s, (left, o.style['top']+c_y-(s.get_height()-o.style['height'])//2)]
-					top_o = o
-					c_y += o.style['top']+o.style['height']+o.style['bottom']
-			else:
-				if o.style['position'] == 'absolute':
-					rect = surf.blit(s, (left, o.style['top']))
+		# Render changed children, positioning them again only if one has moved
+		self._layout.render()
+		placed = self._layout.place(self.style['width'], self.style['border_width'])
+		size = (self.style['width'], self.style['height'])
+		surf = self._composite
+		stale, self._stale = self._stale, set()
+		full = surf is None or surf.get_size() != size or placed is not self._placed
+		if full:
+			# Composite the whole frame, reusing the old surface if it fits
+			if surf is None or surf.get_size() != size:
+				surf = self._composite = _SURFACES_.get(size)
+			areas = [surf.get_rect()]
+			for o, rect in placed:
+				o._rect = rect
+			self._placed = placed
+		else:
+			# Composite only the areas of children which have changed
+			areas = [o._rect for o in stale if o._in_layout is self._layout]
+		for area in areas:
+			surf.set_clip(area)
+			surf.fill(self.style['bg_color'], area)
+			if self.style['border_width'] > 0:
+				pygame.draw.rect(surf, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, self.style['height']-self.style['border_width']//2), self.style['border_width'])
+			for o, rect in placed:
+				if rect.colliderect(area):
+					surf.blit(o.get_surface(), rect)
+		surf.set_clip(None)
+		# Rebuild hotspots only when the layout or a nested frame's hotspots change
+		if full or [o for o in stale if isinstance(o, Frame) and o._hotspots is not self._mapped.get(o)]:
+			self._hotspots, self._mapped = [], {}
+			bounds = surf.get_rect()
+			for o, rect in placed:
+				# Hotspots are clipped to the frame
+				area = rect.clip(bounds)
+				if isinstance(o, Frame):
+					self._hotspots.extend([(h[0].move(area.topleft), h[1]) for h in o._hotspots])
+					self._mapped[o] = o._hotspots
 				else:
-					rect = surf.blit(s, (left, c_y+o.style['top']))
-					c_y += o.style['top']+s.get_height()+o.style['bottom']
-			hs = o.hotspots()
-			if hs:
-				self._hotspots.append((rect, hs))
-		if blit_top:
-			rect = surf.blit(*blit_top)
-			hs = top_o.hotspots()
-			if hs:
-				self._hotspots.append((rect, hs))
+					hs = o.hotspots()
+					if hs:
+						self._hotspots.append((area, hs))
 		return surf
 
 class Text(FormObject):
@@ -575,16 +2070,9 @@ class Text(FormObject):
 		FormObject.__init__(self, value)
 		self._tab_skip = True
 		# Create font
-		if isinstance(label_font, pygame.font.Font):
-			self._font = label_font
-		else:
-			self._font = pygame.font.Font(label_font, int(label_size))
+		self._font = get_font(label_font, label_size, label_style)
 		# Style font
 		self._color = label_color
-		for s in label_style:
-			if s == 'bold' : self._font.set_bold(True)
-			elif s == 'italic' : self._font.set_italic(True)
-			elif s == 'underline' : self._font.set_underline(True)
 		# Default box styles
 		self.style = {
 			# Position
@@ -601,32 +2089,28 @@ class Text(FormObject):
 			if s in self.style:
 				self.style[s] = v
 
-	def get_surface(self):
-		return self._font.render(self._value, True, self._color)
+	def _render(self):
+		return render_text(self._font, self._value, self._color)
 
 	def value(self):
 		return None
 
 class TextInput(FormObject):
 	''' A bare text input field '''
+	_watch = FormObject._watch | frozenset(['_cursor_on', '_cursor_pos'])
+
 	def __init__(self, value='', max_chars=25, input_font=None, input_size=22, input_color=(0,0,0), input_style=[], **kwargs):
 		# Initialise as a form object
 		FormObject.__init__(self, value)
 		# Store some information
 		self._max_chars = max_chars
 		self._cursor_pos = len(self._value)
+		self._xs, self._measured = [0], None
 		self._cursor_reset()
 		# Create font
-		if isinstance(input_font, pygame.font.Font):
-			self._font = input_font
-		else:
-			self._font = pygame.font.Font(input_font, int(input_size))
+		self._font = get_font(input_font, input_size, input_style)
 		# Style font
 		self._color = input_color
-		for s in input_style:
-			if s == 'bold' : self._font.set_bold(True)
-			elif s == 'italic' : self._font.set_italic(True)
-			elif s == 'underline' : self._font.set_underline(True)
 		# Default box styles
 		self.style = {
 			# Appearance
@@ -658,6 +2142,16 @@ class TextInput(FormObject):
 		else:
 			self._cursor_on ^= True
 
+	def _tick(self):
+		# Switch cursor
+		if self._has_focus and time.time() >= self._cursor_switch:
+			self._cursor_reset(False)
+
+	def _deadline(self):
+		if self._has_focus:
+			return self._cursor_switch
+		return None
+
 	def _cursor_forward(self):
 		# Move cursor forwards
 		if self._cursor_pos < len(self._value):
@@ -668,23 +2162,49 @@ class TextInput(FormObject):
 		if self._cursor_pos > 0:
 			self._cursor_pos -= 1
 
-	def _type_char(self, char):
+	def _measure(self):
+		# Rebuild the character offsets if the value was changed elsewhere
+		if self._measured != self._value:
+			self._xs = [0]
+			self._measured = ''
+			self._remeasure(0, 0, self._value)
+
+	def _remeasure(self, p, removed, added):
+		# Update the character offsets for `removed` chars at p being
+		# replaced by `added`, so only the edited chars are measured
+		xs = self._xs
+		x, new = xs[p], []
+		for m in self._font.metrics(added):
+			x += (m or (0,0,0,0,0))[4]
+			new.append(x)
+		d = x - xs[p+removed]
+		xs[p+1:p+removed+1] = new
+		if d:
+			xs[p+len(new)+1:] = [v+d for v in xs[p+len(new)+1:]]
+		self._measured = ''.join([self._measured[:p], added, self._measured[p+removed:]])
+
+	def _type_char(self, chars):
 		# Run hook
 		self._hooks.run('__change_value__')
-		# Add a character behind the cursor
-		if len(self._value) < self._max_chars:
+		# Add characters behind the cursor
+		chars = chars[:self._max_chars-len(self._value)]
+		if chars:
+			if self._measured == self._value:
+				self._remeasure(self._cursor_pos, 0, chars)
 			self._value = ''.join([
 					self._value[:self._cursor_pos],
-					char,
+					chars,
 					self._value[self._cursor_pos:]
 				])
-			self._cursor_pos += 1
+			self._cursor_pos += len(chars)
 
 	def _backspace(self):
 		# Run hook
 		self._hooks.run('__change_value__')
 		# Remove the character behind the cursor
-		if len(self._value) > 0:
+		if self._cursor_pos > 0:
+			if self._measured == self._value:
+				self._remeasure(self._cursor_pos-1, 1, '')
 			self._value = ''.join([
 					self._value[:self._cursor_pos-1],
 					self._value[self._cursor_pos:]
@@ -713,7 +2233,7 @@ class TextInput(FormObject):
 				self._backspace()
 			elif key == 'space':
 				self._type_char(' ')
-			elif len(ukey) == 1:
+			elif ukey:
 				self._type_char(ukey)
 			# Signal event unused
 			else:
@@ -730,6 +2250,8 @@ class TextInput(FormObject):
 		# When the object gets selected
 		self._has_focus = True
 		if self._value == self._default:
+			# Run hook
+			self._hooks.run('__change_value__')
 			self._value = ''
 			self._cursor_pos = 0
 		# Enable key repeating
@@ -743,40 +2265,299 @@ class TextInput(FormObject):
 		# When the object loses focus
 		self._has_focus = False
 		if self._value.strip() == '':
+			# Run hook
+			self._hooks.run('__change_value__')
 			self._value = self._default
 		# Disable key repeating
 		pygame.key.set_repeat()
 
-	def get_surface(self):
+	def _render(self):
 		# Create surface
-		box = pygame.Surface((self.style['width'], self.style['height'])).convert_alpha()
+		box = _SURFACES_.get((self.style['width'], self.style['height']))
 		# Add box
 		width = self.style['width'] + self.style['border_width']*2
 		height = self.style['height'] + self.style['border_width']*2
 		pygame.draw.rect(box, self.style['bg_color'], (0, 0, self.style['width'], self.style['height']))
 		if self.style['border_width'] > 0:
 			pygame.draw.rect(box, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, self.style['height']-self.style['border_width']//2), self.style['border_width'])
-		# Create text
-		to_cursor = self._font.render(self._value[:self._cursor_pos], True, self._color)
-		full_text = self._font.render(self._value, True, self._color)
-		# Determine diplayed area
-		tw, th = to_cursor.get_size()
+		# Determine diplayed area from the character offsets
+		self._measure()
+		tw, th = self._xs[self._cursor_pos], self._font.get_height()
 		padding = (height - th)//2 + 1
 		offset = tw - self.style['width'] + 2*padding
 		offset = (int(offset),0)[offset<0]
+		# Create text for only the visible characters
+		shown = self.style['width']-2*padding
+		start = max(bisect_right(self._xs, offset)-1, 0)
+		end = bisect_left(self._xs, offset+shown)+1
+		text = render_text(self._font, self._value[start:end], self._color)
+		# Place the cursor exactly within the visible text, as the offsets
+		# are built from rounded advances
+		x = padding-offset+self._xs[start]
+		cx = x+self._font.size(self._value[start:self._cursor_pos])[0]
+		if cx > padding+shown:
+			x, cx = x-(cx-padding-shown), padding+shown
 		# Add text to box
-		box.blit(full_text, (padding, padding), (offset,0,self.style['width']-2*padding,th))
-		# Switch cursor
-		if time.time() >= self._cursor_switch:
-			self._cursor_reset(False)
+		box.blit(text, (padding, padding), (padding-x,0,shown,th))
 		# Draw cursor
 		if self._has_focus and self._cursor_on:
-			pygame.draw.line(box, self.style['border_color'], (tw+padding-offset,padding//2), (tw+padding-offset,th+padding))
+			pygame.draw.line(box, self.style['border_color'], (cx,padding//2), (cx,th+padding))
 		return box
 
 	def value(self):
 		return self._value
 
+class TextArea(TextInput):
+	''' A multi-line text input field.
+	The text is kept in a GapBuffer and wrapped into lines which are only
+	re-flowed for the paragraphs an edit touches. '''
+	def __init__(self, value='', max_chars=4096, input_font=None, input_size=22, input_color=(0,0,0), input_style=[], **kwargs):
+		# Initialise as a text input
+		TextInput.__init__(self, value, max_chars, input_font, input_size, input_color, input_style, **kwargs)
+		# Default to a larger box
+		for s, v in (('height', 120), ('width', 300)):
+			if 'input_'+s not in kwargs:
+				self.style[s] = v
+		self._top = 0
+		self._set_text(value)
+
+	def _pad(self):
+		# Space between the border and the text
+		return self.style['border_width']+2
+
+	def _set_text(self, text):
+		# Replace all the text
+		self._buffer = GapBuffer(text)
+		self._cursor_pos = min(self._cursor_pos, len(text))
+		self._wrap_width = self.style['width']-2*self._pad()
+		# Chars first measured for a line, about a line's width
+		self._span = max(1, self._wrap_width//max(1, self._font.size('n')[0]))
+		self._lines = list(self._wrap(0, len(text)))
+		self._changed()
+
+	def _next_line(self, para, i):
+		# Start of the line after the one starting at i in para, or None if
+		# the rest of para fits. Only about a line's width of text is measured.
+		size, width = self._font.size, self._wrap_width
+		lo, n = i+1, self._span
+		while size(para[i:i+n])[0] <= width:
+			if i+n >= len(para):
+				return None
+			lo, n = i+n, n*2
+		# Longest run that fits, broken after a space if possible
+		hi = min(i+n, len(para))-1
+		while lo < hi:
+			mid = (lo+hi+1)//2
+			if size(para[i:mid])[0] <= width:
+				lo = mid
+			else:
+				hi = mid-1
+		sp = para.rfind(' ', i, lo)
+		return (lo, sp+1)[sp > i]
+
+	def _wrap(self, a, b):
+		# Generate the line starts for the text between a and b, breaking at
+		# newlines and wrapping words to the box width
+		text = self._buffer.slice(a, b)
+		p = a
+		for para in text.split('\n'):
+			yield p
+			i = self._next_line(para, 0)
+			while i is not None:
+				yield p+i
+				i = self._next_line(para, i)
+			p += len(para)+1
+
+	def _edit(self, pos, removed, text):
+		# Replace `removed` chars at pos with `text` and re-flow only the
+		# lines touched
+		b, lines = self._buffer, self._lines
+		if removed:
+			b.delete(pos, removed)
+		if text:
+			b.insert(pos, text)
+		d = len(text)-removed
+		start = b.rfind('\n', pos)+1
+		end = b.find('\n', pos+len(text))
+		if end < 0:
+			end = len(b)
+		# Re-flow from a couple of lines before the edit, as a shortened word
+		# can move up a line, until a line starts where an old one did
+		k = max(bisect_left(lines, start), bisect_right(lines, pos)-3)
+		new = []
+		for s in self._wrap(lines[k], end):
+			if s >= pos+len(text):
+				j = bisect_left(lines, s-d)
+				if j < len(lines) and lines[j] == s-d:
+					break
+			new.append(s)
+		else:
+			# Lines after the paragraphs are moved
+			j = bisect_right(lines, end-d)
+		lines[k:] = new+[s+d for s in lines[j:]]
+		self._changed()
+
+	def _line_of(self, pos):
+		# Index of the line containing pos
+		return bisect_right(self._lines, pos)-1
+
+	def _line_end(self, i):
+		# Last cursor position on line i
+		if i+1 < len(self._lines):
+			return self._lines[i+1]-1
+		return len(self._buffer)
+
+	def _cursor_forward(self):
+		# Move cursor forwards
+		if self._cursor_pos < len(self._buffer):
+			self._cursor_pos += 1
+
+	def _cursor_line(self, n):
+		# Move cursor n lines up or down, keeping its column
+		i = self._line_of(self._cursor_pos)
+		t = max(0, min(len(self._lines)-1, i+n))
+		if t != i:
+			col = self._cursor_pos-self._lines[i]
+			self._cursor_pos = min(self._lines[t]+col, self._line_end(t))
+
+	def _type_char(self, chars):
+		# Run hook
+		self._hooks.run('__change_value__')
+		# Add characters behind the cursor
+		chars = chars[:self._max_chars-len(self._buffer)]
+		if chars:
+			self._edit(self._cursor_pos, 0, chars)
+			self._cursor_pos += len(chars)
+
+	def _backspace(self):
+		# Run hook
+		self._hooks.run('__change_value__')
+		# Remove the character behind the cursor
+		if self._cursor_pos > 0:
+			self._edit(self._cursor_pos-1, 1, '')
+			self._cursor_pos -= 1
+
+	def _delete(self):
+		# Run hook
+		self._hooks.run('__change_value__')
+		# Remove the character in front of the cursor
+		if self._cursor_pos < len(self._buffer):
+			self._edit(self._cursor_pos, 1, '')
+
+	def _reset(self):
+		# Run hook
+		self._hooks.run('__change_value__')
+		# Restore value to default
+		self._set_text(self._default)
+
+	def insert_text(self, text):
+		''' Insert text (eg. a paste) at the cursor in one edit, up to max_chars '''
+		self._type_char(text)
+		self._cursor_reset()
+
+	def update(self, e):
+		# Run hook
+		self._hooks.run('__update__')
+		# Do update
+		r = False
+		# Control events when self has focus
+		if e.type == PL.KEYDOWN:
+			key = pygame.key.name(e.key)
+			ukey = e.unicode
+			# Start a new line
+			if key == 'return':
+				self._type_char('\n')
+			# Move cursor
+			elif key == 'left':
+				self._cursor_back()
+			elif key == 'right':
+				self._cursor_forward()
+			elif key == 'up':
+				self._cursor_line(-getattr(e, 'count', 1))
+			elif key == 'down':
+				self._cursor_line(getattr(e, 'count', 1))
+			# Edit text
+			elif key == 'backspace':
+				self._backspace()
+			elif key == 'delete':
+				self._delete()
+			elif key == 'space':
+				self._type_char(' ')
+			elif ukey:
+				self._type_char(ukey)
+			# Signal event unused
+			else:
+				r = True
+			# Update cursor switch
+			self._cursor_reset()
+		else:
+			r = True
+		return r
+
+	def focus(self):
+		# Run hook
+		self._hooks.run('__focus__', '__focus_switch__')
+		# When the object gets selected
+		self._has_focus = True
+		if self.value() == self._default:
+			# Run hook
+			self._hooks.run('__change_value__')
+			self._cursor_pos = 0
+			self._set_text('')
+		# Enable key repeating
+		pygame.key.set_repeat(KEY_REPEAT_DELAY, KEY_REPEAT_INTERVAL)
+		# Update cursor switch
+		self._cursor_reset()
+
+	def blur(self):
+		# Run hook
+		self._hooks.run('__blur__', '__focus_switch__')
+		# When the object loses focus
+		self._has_focus = False
+		if self.value().strip() == '':
+			# Run hook
+			self._hooks.run('__change_value__')
+			self._set_text(self._default)
+		# Disable key repeating
+		pygame.key.set_repeat()
+
+	def _render(self):
+		# Re-flow everything if the box width changed
+		pad = self._pad()
+		if self._wrap_width != self.style['width']-2*pad:
+			self._set_text(self.value())
+		# Create surface
+		box = _SURFACES_.get((self.style['width'], self.style['height']))
+		# Add box
+		pygame.draw.rect(box, self.style['bg_color'], (0, 0, self.style['width'], self.style['height']))
+		if self.style['border_width'] > 0:
+			pygame.draw.rect(box, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, self.style['height']-self.style['border_width']//2), self.style['border_width'])
+		# Scroll to keep the cursor line shown
+		ls = self._font.get_linesize()
+		rows = max(1, (self.style['height']-2*pad)//ls)
+		cl = self._line_of(self._cursor_pos)
+		self._top = max(min(self._top, cl), cl-rows+1)
+		# Add only the shown lines
+		y = pad
+		for i in xrange(self._top, min(self._top+rows, len(self._lines))):
+			start = self._lines[i]
+			if i+1 < len(self._lines):
+				end = self._lines[i+1]
+			else:
+				end = len(self._buffer)
+			text = self._buffer.slice(start, end).rstrip('\n')
+			if text:
+				box.blit(render_text(self._font, text, self._color), (pad, y))
+			# Draw cursor
+			if i == cl and self._has_focus and self._cursor_on:
+				cx = pad+self._font.size(text[:self._cursor_pos-start])[0]
+				pygame.draw.line(box, self.style['border_color'], (cx, y), (cx, y+ls))
+			y += ls
+		return box
+
+	def value(self):
+		return self._buffer.text()
+
 class Input(FormObject):
 	''' A labeled input box '''
 	def __init__(self, label, value='', **kwargs):
@@ -788,6 +2569,8 @@ class Input(FormObject):
 		# Create objects
 		self._label = Text(label, **label_kwargs)
 		self._input = TextInput(value, **input_kwargs)
+		self._label._owner = self._input._owner = self
+		self._input._hooks.add('__change_value__', self._input_changing)
 		# Default box styles
 		self.style = {
 			# Appearance
@@ -806,12 +2589,20 @@ class Input(FormObject):
 			if s in self.style:
 				self.style[s] = v
 
-	def _reset(self):
-		# Run hook
+	def _input_changing(self, child):
+		# Edits to the input change this object's value, run hook
 		self._hooks.run('__change_value__')
-		# Restore value to default
+
+	def _reset(self):
+		# Restore value to default, the input's hook runs this object's
 		self._input._reset()
 
+	def _tick(self):
+		self._input._tick()
+
+	def _deadline(self):
+		return self._input._deadline()
+
 	def update(self, e):
 		# Run hook
 		self._hooks.run('__update__')
@@ -832,7 +2623,7 @@ class Input(FormObject):
 		self._label.blur()
 		self._input.blur()
 
-	def get_surface(self):
+	def _render(self):
 		# Get child surfaces and their sizes
 		l = self._label.get_surface()
 		i = self._input.get_surface()
@@ -842,7 +2633,7 @@ class Input(FormObject):
 		width = sl[0]+padding+si[0]
 		height = max(sl[1], si[1])
 		# Create own surface
-		surf = pygame.Surface((width, height)).convert_alpha()
+		surf = _SURFACES_.get((width, height))
 		surf.fill((0,0,0,0)) # Transparent
 		# Add child surfaces v-centered
 		surf.blit(l, (0,(height-sl[1])//2+1))
@@ -854,12 +2645,19 @@ class Input(FormObject):
 
 class Button(FormObject):
 	''' A button '''
-	def __init__(self, value, function, args, font=None, size=22, color=(50,50,50), focus_color=(0,0,0), style=[], **kwargs):
+	_watch = FormObject._watch | frozenset(['_busy'])
+
+	def __init__(self, value, function, args, font=None, size=22, color=(50,50,50), focus_color=(0,0,0), busy_color=(150,150,150), offload=False, limit=1, style=[], **kwargs):
 		'''
 			value 				-> displayed text
 			function			-> a function refernce eg. max
 			args				-> a tuple of arguments eg. (10, 20)
 			Thus when the button is activated function(args) is called eg. max(10, 20)
+			If the function returns a generator or future the
+			button is busy until it finishes, shown in "busy_color" (None
+			to show no change).
+			offload				-> call the function on the offload pool, see offload()
+			limit				-> runs allowed at once, activating a busy button does nothing
 		'''
 		# Initialise as a form object
 		FormObject.__init__(self, value)
@@ -867,18 +2665,17 @@ class Button(FormObject):
 		self._value = value
 		self._function = function
 		self._args = ((args,), args)[isinstance(args, tuple)]
+		self._actions = {'click': (self.run, (), {})}
+		self._offload = offload
+		self._limit = limit
+		self._runs = 0
+		self._busy = False
 		# Create font
-		if isinstance(font, pygame.font.Font):
-			self._font = font
-		else:
-			self._font = pygame.font.Font(font, int(size))
+		self._font = get_font(font, size, style)
 		# Style font
 		self._color = color
 		self._focus_color = focus_color
-		for s in style:
-			if s == 'bold' : self._font.set_bold(True)
-			elif s == 'italic' : self._font.set_italic(True)
-			elif s == 'underline' : self._font.set_underline(True)
+		self._busy_color = busy_color
 		# Default box styles
 		self.style = {
 			# Appearance
@@ -911,7 +2708,7 @@ class Button(FormObject):
 			(self.style['height'] - th)//2 + self.style['border_width'])
 
 	def hotspots(self):
-		return {'click': (self.run, (), {})}
+		return self._actions
 
 	def update(self, e):
 		# Run hook
@@ -926,17 +2723,36 @@ class Button(FormObject):
 		return True
 
 	def run(self):
-		# Run the function with or without args
-		if self._args:
-			self._function(*self._args)
+		# Wait for a run to finish
+		if self._busy:
+			return
+		if self._offload:
+			task = offload(self._function, self._args, on_done=self._finished, owner=self)
 		else:
-			self._function()
-
-	def get_surface(self):
+			# Run the function with or without args
+			if self._args:
+				r = self._function(*self._args)
+			else:
+				r = self._function()
+			# Keep running a function which has not finished
+			task = r is not None and start_task(r, self._finished)
+		if task:
+			self._runs += 1
+			self._busy = self._runs >= self._limit
+
+	def _finished(self):
+		self._runs -= 1
+		self._busy = self._runs >= self._limit
+
+	def _render(self):
 		# Create text
-		text = self._font.render(self._value, True, (self._color, self._focus_color)[self._has_focus])
+		if self._busy and self._busy_color:
+			color = self._busy_color
+		else:
+			color = (self._color, self._focus_color)[self._has_focus]
+		text = render_text(self._font, self._value, color)
 		# Create surface
-		box = pygame.Surface((self.style['width'], self.style['height'])).convert_alpha()
+		box = _SURFACES_.get((self.style['width'], self.style['height']))
 		# Add box
 		box.fill((self.style['bg_color'], self.style['bg_focus_color'])[self._has_focus])
 		if self.style['border_width'] > 0:
@@ -949,26 +2765,22 @@ class Button(FormObject):
 		return None
 
 class Select(FormObject):
+	_watch = FormObject._watch | frozenset(['_is_active'])
+	_reflow = FormObject._reflow | frozenset(['_is_active'])
+
 	def __init__(self, value=-1, font=None, size=22, color=(0,0,0), style=[], **kwargs):
 		# Initialise as a form object
 		FormObject.__init__(self, value)
 		# Create internals
 		self._options = {}
-		self._index = {}
+		self._index = ObjectIndex()
 		self._is_active = False
 		# Create font
-		if isinstance(font, pygame.font.Font):
-			self._font = font
-		else:
-			self._font = pygame.font.Font(font, int(size))
-			self._size = size
+		self._font = get_font(font, size, style)
+		self._size = size
 		# Style font
 		self._color = color
 		self._style = style
-		for s in style:
-			if s == 'bold' : self._font.set_bold(True)
-			elif s == 'italic' : self._font.set_italic(True)
-			elif s == 'underline' : self._font.set_underline(True)
 		# Default box styles
 		self.style = {
 			# Appearance
@@ -992,58 +2804,80 @@ class Select(FormObject):
 			if s in self.style:
 				self.style[s] = v
 
-	def _cursor_up(self):
-		# Move cursor down
-		if self._value > 0:
-			self._value -= 1
+	def _cursor_move(self, n):
+		# Run hook
+		self._hooks.run('__change_value__')
+		# Move cursor by n options, staying in range
+		if self._length():
+			self._value = max(0, min(self._length()-1, self._value+n))
+
+	def _length(self):
+		# Number of options
+		return len(self._index)
+
+	def _option(self, i):
+		# The (name, value) of option i
+		o = self._options[self._index[i]]
+		return o._name, o._value
 
-	def _cursor_down(self):
-		# Move cursor up
-		if self._value < len(self._index)-1:
-			self._value += 1
+	def _row(self, i):
+		# The rendered name of option i
+		return self._options[self._index[i]].get_surface()
 
 	def add_option(self, name, value, index=None, **kwargs):
+		self.add_options([(name, value)], index, **kwargs)
+
+	def add_options(self, options, index=None, **kwargs):
+		''' Add a list of (name, value) pairs as options in one go '''
 		for k in ['font','color','style']:
 			if k not in kwargs:
 				kwargs[k] = getattr(self, '_'+k)
-		if name not in self._options:
-			# Add object reference
+		names = [n for n, _ in options]
+		if not names:
+			return
+		seen = set()
+		for name in names:
+			if name in self._options or name in seen:
+				raise ValueError('Select object already contains a "%s" option' % name)
+			seen.add(name)
+		# Add object references
+		for name, value in options:
 			self._options[name] = SelectOption(name, value, **kwargs)
-			# Add object index
-			if not index or index >= len(self._index):
-				self._index[len(self._index)] = name
-			else:
-				for i in xrange(index, len(self._index)-1):
-					self._index[i+1] = self._index[i]
-				self._index[index] = name
-			# Adjust size for new text
-			tw, th = self._options[name]._font.size(name)
-			# Adjust constraints to fit text
-			self.style['width'] = max(self.style['width'], STANDARD_MARGIN[0]//2+tw+4+self.style['border_width']*2+SCROLL_BAR_WIDTH)
-			self.style['height'] = max(self.style['height'], th+4+self.style['border_width'])
-			# Determine padding
-			self._padding = (
-				STANDARD_MARGIN[0]//2,
-				#(self.style['width'] - tw)//2 + self.style['border_width'],
-				(self.style['height'] - th)//2 + self.style['border_width'])
-		else:
-			raise ValueError('Select object already contains a "%s" option' % name)
+		self._changed()
+		# Add object index
+		if index is None or index >= len(self._index):
+			index = len(self._index)
+		elif index <= self._value:
+			self._value += len(names)
+		self._index.insert(index, names)
+		# Adjust size for new text
+		tw, th = 0, 0
+		for name in names:
+			w, h = self._options[name]._font.size(name)
+			tw, th = max(tw, w), max(th, h)
+		# Adjust constraints to fit text
+		self.style['width'] = max(self.style['width'], STANDARD_MARGIN[0]//2+tw+4+self.style['border_width']*2+SCROLL_BAR_WIDTH)
+		self.style['height'] = max(self.style['height'], th+4+self.style['border_width'])
+		# Determine padding
+		self._padding = (
+			STANDARD_MARGIN[0]//2,
+			#(self.style['width'] - tw)//2 + self.style['border_width'],
+			(self.style['height'] - th)//2 + self.style['border_width'])
 
 	def rem_option(self, name=None):
 		if not name:
 			name = self._index[len(self._index)-1]
 		if name in self._options:
+			# Run hook, removing the selected option changes the value
+			self._hooks.run('__change_value__')
 			# Delete object
 			self._options.__delitem__(name)
-			# Update indexes
-			x = dict([(v, k) for (k, v) in self._index.iteritems()])[name]
-			for i in xrange(x+1, len(self._index)-1):
-				self._index[i] = self._index[i+1]
-			# Remove index
-			self._index.__delitem__(len(self._index)-1)
-			# Check that the removed item wasn't selected
-			if self._value >= len(self._index):
-				self._value = len(self._index)-1
+			self._changed()
+			# Update index
+			x = self._index.remove(name)
+			# Keep the selection on the same option or in range
+			if x < self._value or self._value >= len(self._index):
+				self._value -= 1
 		else:
 			raise KeyError('Select object does not contain a "%s" option' % name)
 
@@ -1057,15 +2891,20 @@ class Select(FormObject):
 			key = pygame.key.name(e.key)
 			# Switch activity
 			if e.key == PL.K_RETURN:
-				if self._is_active:
-					# Run hook
-					self._hooks.run('__change_value__')
 				self._is_active ^= True
-			# Move cursor
+			# Move cursor (coalesced events carry a count of presses)
 			elif key == 'up' and self._is_active:
-				self._cursor_up()
+				self._cursor_move(-getattr(e, 'count', 1))
 			elif key == 'down' and self._is_active:
-				self._cursor_down()
+				self._cursor_move(getattr(e, 'count', 1))
+			elif e.key == PL.K_PAGEUP and self._is_active:
+				self._cursor_move(-SELECT_ROWS)
+			elif e.key == PL.K_PAGEDOWN and self._is_active:
+				self._cursor_move(SELECT_ROWS)
+			elif e.key == PL.K_HOME and self._is_active:
+				self._cursor_move(-self._length())
+			elif e.key == PL.K_END and self._is_active:
+				self._cursor_move(self._length())
 			# Signal event unused
 			else:
 				r = True
@@ -1073,12 +2912,13 @@ class Select(FormObject):
 			r = True
 		return r
 
-	def get_surface(self):
+	def _render(self):
 		# Make sure the object has options
-		if not len(self._options):
+		n = self._length()
+		if not n:
 			raise AttributeError('Select has no options.')
 		# Create side-arrow
-		arrow = pygame.Surface((self.style['height']-self.style['border_width'], self.style['height']))
+		arrow = _SURFACES_.get((self.style['height']-self.style['border_width'], self.style['height']), False)
 		# Fill and border
 		arrow.fill((200,200,200))
 		if self.style['border_width'] > 0:
@@ -1095,29 +2935,22 @@ class Select(FormObject):
 		# Create surface
 		if self._is_active:
 			# Create ranges
-			count = 5
-			if len(self._index) < count:
-				count = len(self._index)
-				irange = (0, count)
-			elif self._value < 2:
-				irange = (0, count)
-			elif self._value > len(self._index)-3:
-				irange = (len(self._index)-count, len(self._index))
-			else:
-				irange = (self._value-2, self._value+3)
+			count = min(SELECT_ROWS, n)
+			start = min(max(self._value-SELECT_ROWS//2, 0), n-count)
+			irange = (start, start+count)
 			# Create box
 			height = (self._font.get_linesize()+self._padding[1]*2)*count - 1
-			box = pygame.Surface((self.style['width']+self.style['height']-self.style['border_width'], height)).convert_alpha()
+			box = _SURFACES_.get((self.style['width']+self.style['height']-self.style['border_width'], height))
 			box.fill((0,0,0,0))
 			# Add box
 			pygame.draw.rect(box, self.style['bg_color'], (0, 0, self.style['width'], height))
 			if self.style['border_width'] > 0:
 				pygame.draw.rect(box, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, height-self.style['border_width']//2), self.style['border_width'])
 			# Create hilight
-			hilight = pygame.Surface((self.style['width']-(3*self.style['border_width']+SCROLL_BAR_WIDTH), self.style['height']))
+			hilight = _SURFACES_.get((self.style['width']-(3*self.style['border_width']+SCROLL_BAR_WIDTH), self.style['height']), False)
 			hilight.fill(self.style['bg_focus_color'])
 			# Scroll bar
-			sp = (height - 2.*self.style['border_width'])/len(self._index)
+			sp = (height - 2.*self.style['border_width'])/n
 			lx = self.style['width']-(SCROLL_BAR_WIDTH + 2*self.style['border_width'])
 			s1 = sp*irange[0]+self.style['border_width']
 			s2 = sp*irange[1]+self.style['border_width'] - s1
@@ -1129,34 +2962,95 @@ class Select(FormObject):
 				# Hilight
 				if i == self._value:
 					box.blit(hilight, (self.style['border_width'], cy-self._padding[1]))
-				# Text
-				text = self._options[self._index[i]].get_surface()
-				box.blit(text, (self._padding[0], cy))
+				# Text, kept clear of the scroll bar
+				text = self._row(i)
+				box.blit(text, (self._padding[0], cy), (0, 0, lx-self._padding[0], text.get_height()))
 				cy += self._font.get_linesize()+self._padding[1]*2
+			_SURFACES_.put(hilight)
 		else:
 			# Create text
 			if self._value >= 0:
-				text = self._options[self._index[self._value]].get_surface()
+				text = self._row(self._value)
 			else:
 				text = None
-			box = pygame.Surface((self.style['width']+self.style['height']-self.style['border_width'], self.style['height'])).convert_alpha()
+			box = _SURFACES_.get((self.style['width']+self.style['height']-self.style['border_width'], self.style['height']))
 			# Add box
 			box.fill((self.style['bg_color'],self.style['bg_focus_color'])[self._has_focus])
 			if self.style['border_width'] > 0:
 				pygame.draw.rect(box, self.style['border_color'], (0, 0, self.style['width']-self.style['border_width']//2, self.style['height']-self.style['border_width']//2), self.style['border_width'])
 			# Add text to box [centered H & V]
 			if text:
-				box.blit(text, self._padding)
+				box.blit(text, self._padding, (0, 0, self.style['width']-self._padding[0]-self.style['border_width'], text.get_height()))
 		# Add arrow to main surface
 		box.blit(arrow, (self.style['width'], (box.get_height()-arrow.get_height())//2))
+		_SURFACES_.put(arrow)
 		return box
 
 	def value(self):
 		if self._value >= 0:
-			return self._options[self._index[self._value]]._value
+			return self._option(self._value)[1]
 		else:
 			return None
 
+class VirtualSelect(Select):
+	''' A Select over a large or lazily provided list of options.
+	Only the visible rows are measured and rendered, and a bounded number
+	of rendered rows are kept.
+		options	-> a sequence of names or (name, value) pairs, or a
+				   function f(i) returning one
+		count	-> the number of options when `options` is a function '''
+	def __init__(self, options, count=None, value=-1, **kwargs):
+		# Initialise as a select
+		Select.__init__(self, value, **kwargs)
+		self._rows = OrderedDict()
+		self.set_options(options, count)
+		# Size to the font rather than to every option
+		th = self._font.get_linesize()
+		self.style['height'] = max(self.style['height'], th+4+self.style['border_width'])
+		self._padding = (
+			STANDARD_MARGIN[0]//2,
+			(self.style['height'] - th)//2 + self.style['border_width'])
+
+	def set_options(self, options, count=None):
+		''' Replace the options source '''
+		self._source = options
+		self._count = count
+		self._rows.clear()
+		self._changed()
+		if self._value >= self._length():
+			# Run hook
+			self._hooks.run('__change_value__')
+			self._value = self._length()-1
+
+	def add_options(self, options, index=None, **kwargs):
+		raise TypeError('VirtualSelect options come from its source, use set_options()')
+
+	def rem_option(self, name=None):
+		raise TypeError('VirtualSelect options come from its source, use set_options()')
+
+	def _length(self):
+		if self._count is not None:
+			return self._count
+		return len(self._source)
+
+	def _option(self, i):
+		if callable(self._source):
+			o = self._source(i)
+		else:
+			o = self._source[i]
+		if isinstance(o, tuple):
+			return o
+		return o, o
+
+	def _row(self, i):
+		# Render rows on demand, keeping the most recently used
+		text = self._rows.pop(i, None)
+		if text is None:
+			text = self._font.render('%s' % (self._option(i)[0],), True, self._color)
+		self._rows[i] = text
+		if len(self._rows) > SELECT_ROW_CACHE:
+			self._rows.popitem(False)
+		return text
 
 class SelectOption(FormObject):
 	def __init__(self, name, value, font=None, size=22, color=(0,0,0), style=[]):
@@ -1164,19 +3058,231 @@ class SelectOption(FormObject):
 		self._name = name
 		self._value = value
 		# Create font
-		if isinstance(font, pygame.font.Font):
-			self._font = font
-		else:
-			self._font = pygame.font.Font(font, int(size))
+		self._font = get_font(font, size, style)
 		# Style font
 		self._color = color
+
+	def _render(self):
+		return render_text(self._font, self._name, self._color)
+
+def _tuples(value):
+	# JSON has no tuples, which colours, sizes and arguments are expected to be
+	if isinstance(value, list):
+		return tuple([_tuples(v) for v in value])
+	return value
+
+def read_spec(path):
+	''' Read a form spec from a JSON file, or a YAML file if PyYAML is installed '''
+	if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+		if yaml is None:
+			raise ImportError('Loading YAML form specs needs PyYAML')
+		load = yaml.safe_load
+	else:
+		load = json.load
+	f = open(path)
+	try:
+		return load(f)
+	finally:
+		f.close()
+
+class FormSpec(object):
+	''' A declarative description of a form, checked and compiled once, from which
+	Forms are built with their objects created lazily. '''
+	def __init__(self, spec, types=None):
+		''' "spec" is a dict, or the path of a JSON or YAML file holding one:
+			{'form': {<Form arguments>},
+			 'objects': [{'name': <name>, 'type': <class name>, <arguments>}, ...]}
+		A Select's "options" are a list of [name, value] and a Frame's "objects"
+		a list like the form's. A Button "function" given as a string names an action.
+		"types" maps extra type names to FormObject classes. '''
+		if isinstance(spec, basestring):
+			spec = read_spec(spec)
+		self._types = types or {}
+		self._form = dict([(str(k), _tuples(v)) for k, v in spec.get('form', {}).iteritems()])
+		self._objects = tuple([self._compile(o) for o in spec.get('objects', ())])
+		# Heights of built objects by class, for the stand ins of the rest
+		self._heights = {}
+
+	def __len__(self):
+		return len(self._objects)
+
+	def _compile(self, o):
+		''' Return an object's (name, class, kwargs, options, objects) '''
+		o = dict(o)
+		for k in ('name', 'type'):
+			if k not in o:
+				raise ValueError('Form spec object is missing "%s": %r' % (k, o))
+		name, kind = o.pop('name'), o.pop('type')
+		cls = self._types.get(kind) or globals().get(kind)
+		if not isinstance(cls, type) or not issubclass(cls, FormObject) or cls is LazyObject:
+			raise ValueError('Form spec object "%s" has unknown type "%s"' % (name, kind))
+		# Frame contents are part of the Frame's entry
+		objects = None
+		if issubclass(cls, Frame):
+			objects = tuple([self._compile(c) for c in o.pop('objects', ())])
+		# Select options are added once it is built, a VirtualSelect takes them as an argument
+		options = ()
+		if issubclass(cls, Select) and not issubclass(cls, VirtualSelect):
+			options = _tuples(o.pop('options', []))
+		kwargs = dict([(str(k), _tuples(v)) for k, v in o.iteritems()])
+		return (name, cls, kwargs, options, objects)
+
+	def build(self, actions=None, lazy=True, **kwargs):
+		''' Return a new Form holding the spec's objects.\n"actions" maps the names of Button functions to functions, "submit" and "clear" are the form's own by default.\nUnless "lazy" is False, objects outside Frames are only built when first drawn in view or given focus.\nkwargs override the spec's Form arguments. '''
+		args = dict(self._form)
+		args.update(kwargs)
+		form = Form(**args)
+		objects = []
+		for entry in self._objects:
+			if lazy and entry[4] is None:
+				objects.append((entry[0], LazyObject(form, entry, self, actions)))
+				form._lazy += 1
+			else:
+				objects.append((entry[0], self._build(entry, form, actions)))
+		form.add_objects(objects)
+		return form
+
+	def _build(self, entry, form, actions):
+		''' Create the object of a compiled entry '''
+		name, cls, kwargs, options, objects = entry
+		function = kwargs.get('function')
+		if isinstance(function, basestring):
+			kwargs = dict(kwargs)
+			kwargs['function'] = self._action(function, form, actions)
+		obj = cls(**kwargs)
+		if options:
+			obj.add_options(options)
+		if objects:
+			obj.add_objects([(e[0], self._build(e, form, actions)) for e in objects])
+		return obj
+
+	def _action(self, name, form, actions):
+		if actions and name in actions:
+			return actions[name]
+		if name in ('submit', 'clear'):
+			return getattr(form, name)
+		raise KeyError('Form spec has no action "%s"' % name)
+
+def load_form(spec, actions=None, lazy=True, **kwargs):
+	''' Build a Form from a spec dict or file, see FormSpec.\nSpec files are only compiled again once they have changed. '''
+	if isinstance(spec, basestring):
+		key = os.path.abspath(spec)
+		mtime = os.path.getmtime(key)
+		if key not in _SPECS_ or _SPECS_[key][0] != mtime:
+			_SPECS_[key] = (mtime, FormSpec(key))
+		spec = _SPECS_[key][1]
+	elif not isinstance(spec, FormSpec):
+		spec = FormSpec(spec)
+	return spec.build(actions, lazy, **kwargs)
+
+class LazyObject(FormObject):
+	''' Stands in for an object of a FormSpec until it is first drawn in view or
+	given focus, when the object is built and put in its place on the form. '''
+	def __init__(self, form, entry, spec, actions=None):
+		self._form = form
+		self._entry = entry
+		self._spec = spec
+		self._actions = actions
+		self._object = None
+		self._hooks = HookController(self)
+		self._value = self._default = None
+		self._has_focus = False
+		self._in_frame = None
+		# Take the object's margins, if it was given them, and the height of its kind
+		self._height = spec._heights.get(entry[1], LAZY_HEIGHT)
+		style = {
+			'position'		: 'relative',
+			'top'			: STANDARD_MARGIN[1]//2,
+			'bottom'		: STANDARD_MARGIN[1]//2,
+			'left'			: STANDARD_MARGIN[0]//2,
+			'right'			: STANDARD_MARGIN[0]//2
+		}
 		for s in style:
-			if s == 'bold' : self._font.set_bold(True)
-			elif s == 'italic' : self._font.set_italic(True)
-			elif s == 'underline' : self._font.set_underline(True)
+			if s in entry[2]:
+				style[s] = entry[2][s]
+		self.style = style
+
+	def realize(self):
+		''' Build the object, replacing this stand in on its form.\nReturns the object. '''
+		if self._object is None:
+			obj = self._object = self._spec._build(self._entry, self._form, self._actions)
+			form, name = self._form, self._entry[0]
+			# Hand over hooks added before the object was built
+			for hook, listeners in self._hooks._listeners.iteritems():
+				for p, _, f, a, k, o in listeners:
+					obj._hooks.add(hook, f, a, k, -p, o)
+			for hook, watchers in self._hooks._watchers.iteritems():
+				for f, a in watchers:
+					obj._hooks.watch(hook, f, a)
+			if form._objects.get(name) is self:
+				form._objects[name] = obj
+				# The object takes over the area the stand in was drawn in
+				obj._in_layout = self._in_layout
+				obj._rect = self._rect
+				form._layout.reset()
+				form._grid = None
+				form._lazy -= 1
+			self._spec._heights[self._entry[1]] = obj.get_surface().get_height()
+		return self._object
+
+	# Whether the form skips the object needs the object
+	_tab_skip = property(lambda self: self.realize()._tab_skip)
+
+	def _render(self):
+		surf = _SURFACES_.get((1, self._height))
+		surf.fill((0,0,0,0)) # Transparent
+		return surf
 
-	def get_surface(self):
-		return self._font.render(self._name, True, self._color)
+	def _reset(self):
+		# An object not yet built still has its default value
+		if self._object is not None:
+			self._object._reset()
+
+	def add_hook(self, *args, **kwargs):
+		# Hooks are kept until the object is built
+		if self._object is None:
+			FormObject.add_hook(self, *args, **kwargs)
+		else:
+			self._object.add_hook(*args, **kwargs)
+
+	def rem_hook(self, *args, **kwargs):
+		if self._object is None:
+			FormObject.rem_hook(self, *args, **kwargs)
+		else:
+			self._object.rem_hook(*args, **kwargs)
+
+	def update(self, e):
+		return self.realize().update(e)
+
+	def focus(self):
+		self.realize().focus()
+
+	def blur(self):
+		self.realize().blur()
+
+	def _spec_value(self):
+		# The value of the object, known from its spec until it is built other
+		# than for types which may work theirs out differently, or _MISSING_
+		if self._object is not None:
+			return self._object.value()
+		name, cls, kwargs, options, objects = self._entry
+		if cls in (TextInput, TextArea, Input):
+			return kwargs.get('value', '')
+		elif cls in (Text, Button, Image, Seperator):
+			return None
+		elif cls is Select:
+			i = kwargs.get('value', -1)
+			if i < 0:
+				return None
+			elif i < len(options):
+				return options[i][1]
+		return _MISSING_
+
+	def value(self):
+		value = self._spec_value()
+		if value is _MISSING_:
+			value = self.realize().value()
+		return value
 
 if __name__ == '__main__':
 	# Run example
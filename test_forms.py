@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# Copyright 2009 Jeremy Worboys <jemthealmighty@gmail.com>
+# Licensed for distribution under the GPL version 3
+#
+# Headless behaviour tests for forms.py
+#
+# Usage:
+#	python test_forms.py [-v]
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import sys, random, unittest
+import pygame
+import pygame.locals as PL
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+pygame.init()
+SCREEN = pygame.display.set_mode((400,300), 0, 32)
+import forms
+
+class ObjectIndexTest(unittest.TestCase):
+	def test_random_edits_keep_order(self):
+		# Compare against a plain list after every edit
+		rand = random.Random(8)
+		index, names, n = forms.ObjectIndex(), [], 0
+		for _ in xrange(2000):
+			if names and rand.random() < 0.4:
+				name = rand.choice(names)
+				self.assertEqual(index.remove(name), names.index(name))
+				names.remove(name)
+			else:
+				i = rand.randint(0, len(names))
+				new = ['n%d' % (n+k) for k in xrange(rand.randint(1, 3))]
+				n += len(new)
+				index.insert(i, new)
+				names[i:i] = new
+			self.assertEqual(list(index), names)
+			self.assertEqual(len(index), len(names))
+		for name in names:
+			self.assertTrue(name in index)
+		self.assertFalse('missing' in index)
+
+	def test_form_keeps_selection_on_object(self):
+		f = forms.Form(False)
+		f.add_objects([('a', forms.Text('a')), ('b', forms.Text('b')), ('c', forms.Text('c'))])
+		f._selected = 2
+		f.add_object('first', forms.Text('first'), 0)
+		self.assertEqual(f._index[f._selected], 'c')
+		f.rem_object('a')
+		self.assertEqual(f._index[f._selected], 'c')
+		self.assertEqual(list(f._index), ['first', 'b', 'c'])
+
+class GapBufferTest(unittest.TestCase):
+	def test_random_edits_match_string(self):
+		rand = random.Random(11)
+		buf, text = forms.GapBuffer('hello\nworld', gap=4), u'hello\nworld'
+		for _ in xrange(3000):
+			pos = rand.randint(0, len(text))
+			if rand.random() < 0.6:
+				chars = rand.choice([u'a', u'bc', u'\n', u' ', u'longer insert'])
+				buf.insert(pos, chars)
+				text = text[:pos]+chars+text[pos:]
+			else:
+				n = rand.randint(0, 3)
+				buf.delete(pos, n)
+				text = text[:pos]+text[pos+n:]
+			self.assertEqual(len(buf), len(text))
+			self.assertEqual(buf.text(), text)
+			a = rand.randint(0, len(text))
+			b = rand.randint(a, len(text))
+			self.assertEqual(buf.slice(a, b), text[a:b])
+			self.assertEqual(buf.find(u'\n', a), text.find(u'\n', a))
+			self.assertEqual(buf.rfind(u'\n', b), text.rfind(u'\n', 0, b))
+
+class TextAreaTest(unittest.TestCase):
+	def test_reflow_matches_full_wrap(self):
+		rand = random.Random(12)
+		ta = forms.TextArea('', max_chars=100000, input_width=250)
+		words = [u'a', u'bb', u'ccc', u'dddd', u'e'*40, u'W', u' ', u'  ', u'\n']
+		for _ in xrange(1500):
+			ta._cursor_pos = rand.randint(0, len(ta._buffer))
+			r = rand.random()
+			if r < 0.6:
+				ta._type_char(rand.choice(words)+rand.choice([u'', u' ']))
+			elif r < 0.8:
+				ta._backspace()
+			else:
+				ta._delete()
+			self.assertEqual(ta._lines, list(ta._wrap(0, len(ta._buffer))))
+
+	def test_lines_fit_box(self):
+		ta = forms.TextArea(u' '.join([u'word%d' % i for i in xrange(200)]), max_chars=100000)
+		for i, start in enumerate(ta._lines):
+			end = ta._line_end(i)
+			self.assertTrue(end-start == 1 or ta._font.size(ta._buffer.slice(start, end).rstrip())[0] <= ta._wrap_width)
+
+def key(k, u=u''):
+	return pygame.event.Event(PL.KEYDOWN, key=k, unicode=u, mod=0)
+
+class ModalTest(unittest.TestCase):
+	def setUp(self):
+		self.results = []
+		self.parent = forms.Form(False)
+		self.parent._flip = False
+		self.modal = forms.Form()
+		self.modal._flip = False
+		self.modal.add_object('m', forms.TextInput(''))
+		self.parent.add_objects([('open', forms.Button('Open', self.open, ())), ('p', forms.TextInput(''))])
+		self.parent._draw(SCREEN)
+
+	def open(self):
+		self.parent.open_modal(SCREEN, self.modal, callback=self.results.append)
+
+	def test_events_after_opening_go_to_modal(self):
+		self.parent.update_events(SCREEN, [key(PL.K_RETURN), key(PL.K_z, u'z')])
+		self.assertTrue(self.parent._modal is self.modal)
+		self.assertEqual(self.modal.get_value('m'), u'z')
+		self.assertEqual(self.parent.get_value('p'), u'')
+
+	def test_submit_in_same_batch_closes_modal(self):
+		self.parent.update_events(SCREEN, [key(PL.K_RETURN), key(PL.K_z, u'z'), key(PL.K_RETURN)])
+		self.assertTrue(self.parent._modal is None)
+		self.assertEqual(len(self.results), 1)
+		self.assertEqual(self.results[0]['m'], u'z')
+		# The parent's button can open it again
+		self.parent.update_events(SCREEN, [key(PL.K_RETURN)])
+		self.assertTrue(self.parent._modal is self.modal)
+
+	def test_single_update_opens_modal(self):
+		self.parent.update(SCREEN, key(PL.K_RETURN))
+		self.parent.update(SCREEN, key(PL.K_z, u'z'))
+		self.assertEqual(self.modal.get_value('m'), u'z')
+
+	def test_focus_given_back_once(self):
+		calls = []
+		button = self.parent._objects['open']
+		button.focus()
+		button.add_hook('__focus__', lambda o: calls.append('focus'))
+		button.add_hook('__blur__', lambda o: calls.append('blur'))
+		self.parent.update_events(SCREEN, [key(PL.K_RETURN)])
+		self.parent.close_modal()
+		self.assertEqual(calls, ['blur', 'focus'])
+		self.assertTrue(button._has_focus)
+
+class JournalTest(unittest.TestCase):
+	def setUp(self):
+		self.form = forms.Form(False)
+		self.form._flip = False
+		self.select = forms.Select()
+		self.select.add_options([('o%d' % i, i) for i in xrange(6)])
+		self.select._value = 1
+		self.form.add_objects([('sel', self.select), ('t', forms.TextInput('y'))])
+		self.form._draw(SCREEN)
+
+	def keys(self, *keys):
+		for k in keys:
+			self.form.update(SCREEN, key(k))
+
+	def test_select_first_change(self):
+		result = forms.FormResult(self.form._objects, self.form._journal)
+		self.keys(PL.K_RETURN, PL.K_DOWN, PL.K_DOWN, PL.K_RETURN)
+		self.assertEqual(self.form.changes(), [(1, 'sel', 1, 2), (2, 'sel', 2, 3)])
+		self.assertEqual(result['sel'], 1)
+		self.assertEqual(self.form._objects['sel'].value(), 3)
+
+	def test_values_not_read_on_add(self):
+		reads = []
+		class Counted(forms.TextInput):
+			def value(self):
+				reads.append(1)
+				return forms.TextInput.value(self)
+		obj = Counted('z')
+		self.form.add_object('c', obj)
+		self.assertEqual(reads, [])
+		obj._type_char('a')
+		self.form._draw(SCREEN)
+		self.assertEqual(self.form.changes(), [(1, 'c', 'z', 'za')])
+
+	def test_rem_hook_keeps_journal(self):
+		t = self.form._objects['t']
+		calls = []
+		t.add_hook('__change_value__', lambda o: calls.append(1))
+		t.rem_hook('__change_value__')
+		t._type_char('Z')
+		self.assertEqual(self.form.changes(), [(1, 't', 'y', 'yZ')])
+		self.assertEqual(calls, [])
+		self.form.rem_object('t')
+		t._type_char('Q')
+		self.assertEqual(self.form.changes(1), [])
+
+	def test_result_keeps_snapshot(self):
+		t = self.form._objects['t']
+		t._type_char('a')
+		result = forms.FormResult(self.form._objects, self.form._journal)
+		t._type_char('b')
+		t._type_char('c')
+		self.assertEqual(result['t'], 'ya')
+		self.assertEqual(result.t, 'ya')
+		self.assertEqual(forms.FormResult(self.form._objects, self.form._journal)['t'], 'yabc')
+
+	def test_result_raises_once_evicted(self):
+		self.form._journal = forms.ChangeJournal(self.form._objects, size=3)
+		for name, obj in self.form._objects.iteritems():
+			self.form._journal.track(name, obj)
+		t = self.form._objects['t']
+		result = forms.FormResult(self.form._objects, self.form._journal)
+		for c in 'abc':
+			t._type_char(c)
+			self.form._draw(SCREEN)
+		self.assertEqual(result['t'], 'y')
+		result = forms.FormResult(self.form._objects, self.form._journal)
+		for c in 'defg':
+			t._type_char(c)
+			self.form._draw(SCREEN)
+		self.assertRaises(ValueError, result.__getitem__, 't')
+		self.assertRaises(ValueError, self.form.changes, 1)
+
+class DoneFuture(object):
+	# A future which has already finished, without a done callback ever firing
+	def done(self): return True
+	def cancelled(self): return False
+	def cancel(self): return False
+	def result(self): return None
+	def add_done_callback(self, function): pass
+
+class NoPostPool(object):
+	def submit(self, function, *args, **kwargs):
+		return DoneFuture()
+
+class OffloadTest(unittest.TestCase):
+	def setUp(self):
+		self.pool = forms.set_pool(NoPostPool())
+
+	def tearDown(self):
+		forms.set_pool(self.pool)
+		forms._OFFLOADED_.clear()
+
+	def test_lost_done_event_is_polled(self):
+		f = forms.Form(False)
+		f._flip = False
+		button = forms.Button('Go', lambda: None, (), offload=True)
+		f.add_object('b', button)
+		f._draw(SCREEN)
+		button.run()
+		self.assertTrue(button._busy)
+		self.assertTrue(f._deadline() is not None)
+		f.update_events(SCREEN, [])
+		self.assertFalse(button._busy)
+		self.assertFalse(forms._OFFLOADED_)
+
+	def test_failed_post_is_ignored(self):
+		post = pygame.event.post
+		def full(e):
+			raise pygame.error('Event queue full')
+		pygame.event.post = full
+		try:
+			forms._post_done(None, DoneFuture())
+		finally:
+			pygame.event.post = post
+
+if __name__ == '__main__':
+	unittest.main()